@@ -109,14 +109,14 @@ except ImportError as e: logger.warning(f"No se pudo importar actions.planner_to
 
 # Power Automate
 try:
-    from actions.power_automate import (listar_flows, obtener_flow, crear_flow, actualizar_flow, eliminar_flow, ejecutar_flow, obtener_estado_ejecucion_flow)
-    acciones_disponibles.update({"flow_listar": listar_flows, "flow_obtener": obtener_flow, "flow_crear": crear_flow, "flow_actualizar": actualizar_flow, "flow_eliminar": eliminar_flow, "flow_ejecutar": ejecutar_flow, "flow_obtener_estado_ejecucion": obtener_estado_ejecucion_flow})
+    from actions.power_automate import (listar_flows, obtener_flow, crear_flow, actualizar_flow, eliminar_flow, ejecutar_flow, obtener_estado_ejecucion_flow, obtener_estados_ejecucion_flows, obtener_estados_batch, listar_flows_con_detalles, eliminar_flows)
+    acciones_disponibles.update({"flow_listar": listar_flows, "flow_obtener": obtener_flow, "flow_crear": crear_flow, "flow_actualizar": actualizar_flow, "flow_eliminar": eliminar_flow, "flow_ejecutar": ejecutar_flow, "flow_obtener_estado_ejecucion": obtener_estado_ejecucion_flow, "flow_obtener_estados_ejecucion": obtener_estados_ejecucion_flows, "flow_obtener_estados_batch": obtener_estados_batch, "flow_listar_con_detalles": listar_flows_con_detalles, "flow_eliminar_varios": eliminar_flows})
 except ImportError as e: logger.warning(f"No se pudo importar actions.power_automate: {e}")
 
 # Power BI
 try:
-    from actions.power_bi import (listar_workspaces, obtener_workspace, listar_dashboards, obtener_dashboard, listar_reports, obtener_reporte, listar_datasets, obtener_dataset, refrescar_dataset, obtener_estado_refresco_dataset, obtener_embed_url)
-    acciones_disponibles.update({"pbi_listar_workspaces": listar_workspaces, "pbi_obtener_workspace": obtener_workspace, "pbi_listar_dashboards": listar_dashboards, "pbi_obtener_dashboard": obtener_dashboard, "pbi_listar_reports": listar_reports, "pbi_obtener_reporte": obtener_reporte, "pbi_listar_datasets": listar_datasets, "pbi_obtener_dataset": obtener_dataset, "pbi_refrescar_dataset": refrescar_dataset, "pbi_obtener_estado_refresco": obtener_estado_refresco_dataset, "pbi_obtener_embed_url": obtener_embed_url})
+    from actions.power_bi import (listar_workspaces, obtener_workspace, listar_dashboards, obtener_dashboard, listar_reports, obtener_reporte, listar_datasets, obtener_dataset, refrescar_dataset, obtener_estado_refresco_dataset, obtener_embed_url, obtener_contenido_workspace, ejecutar_lote_pbi, esperar_refresco_dataset, listar_datasets_multi, listar_dashboards_multi, listar_reports_multi, listar_workspaces_con_contenido, obtener_varios, refrescar_datasets, obtener_estados_refresco, listar_contenido_workspaces, refrescar_dataset_y_esperar, obtener_embed_info)
+    acciones_disponibles.update({"pbi_listar_workspaces": listar_workspaces, "pbi_obtener_workspace": obtener_workspace, "pbi_listar_dashboards": listar_dashboards, "pbi_obtener_dashboard": obtener_dashboard, "pbi_listar_reports": listar_reports, "pbi_obtener_reporte": obtener_reporte, "pbi_listar_datasets": listar_datasets, "pbi_obtener_dataset": obtener_dataset, "pbi_refrescar_dataset": refrescar_dataset, "pbi_obtener_estado_refresco": obtener_estado_refresco_dataset, "pbi_obtener_embed_url": obtener_embed_url, "pbi_obtener_contenido_workspace": obtener_contenido_workspace, "pbi_ejecutar_lote": ejecutar_lote_pbi, "pbi_esperar_refresco": esperar_refresco_dataset, "pbi_listar_datasets_multi": listar_datasets_multi, "pbi_listar_dashboards_multi": listar_dashboards_multi, "pbi_listar_reports_multi": listar_reports_multi, "pbi_listar_workspaces_con_contenido": listar_workspaces_con_contenido, "pbi_obtener_varios": obtener_varios, "pbi_refrescar_datasets": refrescar_datasets, "pbi_obtener_estados_refresco": obtener_estados_refresco, "pbi_listar_contenido_workspaces": listar_contenido_workspaces, "pbi_refrescar_y_esperar": refrescar_dataset_y_esperar, "pbi_obtener_embed_info": obtener_embed_info})
 except ImportError as e: logger.warning(f"No se pudo importar actions.power_bi: {e}")
 
 # --- Verificación Final ---
@@ -1,169 +1,630 @@
 # actions/power_automate.py (Refactorizado v3 - Corrección Final)
 
+import atexit
 import logging
 import os
+import re
+import threading
+import time
 import requests # Para ejecutar_flow y tipos de excepción
 import json
-from typing import Dict, List, Optional, Union, Any
+import queue
+import random
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from types import MappingProxyType
+from urllib.parse import quote
+from urllib3.util.retry import Retry
+from typing import TYPE_CHECKING, Dict, Iterator, List, Mapping, Optional, Tuple, Any
 
-# Importar Credential de Azure Identity para autenticación con Azure Management API
-# CORRECCIÓN: Eliminar try...except aquí. Si no se puede importar, debe fallar.
-from azure.identity import ClientSecretCredential, CredentialUnavailableError
+# azure.identity se importa en el primer uso (_get_azure_mgmt_token): su import cuesta decenas
+# de ms en frío y las invocaciones que no tocan ARM (ej. ejecutar_flow) no lo necesitan.
+if TYPE_CHECKING:
+    from azure.identity import ClientSecretCredential
 
 # Importar helper HTTP y constantes
 try:
-    from ..shared.helpers.http_client import hacer_llamada_api
+    from ..shared.helpers.http_client import hacer_llamada_api, crear_sesion_http, escribir_json, leer_json, segundos_retry_after, OPCIONES_SOCKET_KEEPALIVE
     from ..shared.constants import GRAPH_API_TIMEOUT # Timeout base
 except ImportError as e:
-    logging.critical(f"Error CRÍTICO importando helpers/constantes en Power Automate: {e}. Verifica la estructura y PYTHONPATH.", exc_info=True)
-    GRAPH_API_TIMEOUT = 45 # Default si falla import
+    logging.critical("Error CRÍTICO importando helpers/constantes en Power Automate: %s. Verifica la estructura y PYTHONPATH.", e, exc_info=True)
     raise ImportError("No se pudo importar 'hacer_llamada_api' desde helpers.") from e
 
 # Usar el logger estándar de Azure Functions
 logger = logging.getLogger("azure.functions")
 
 # --- Constantes y Variables de Entorno Específicas para Azure Management ---
-try:
-    AZURE_SUBSCRIPTION_ID = os.environ['AZURE_SUBSCRIPTION_ID']
-    AZURE_RESOURCE_GROUP = os.environ['AZURE_RESOURCE_GROUP']
-    AZURE_LOCATION = os.environ.get('AZURE_LOCATION')
-    AZURE_CLIENT_ID = os.environ['AZURE_CLIENT_ID_MGMT']
-    AZURE_TENANT_ID = os.environ['AZURE_TENANT_ID']
-    AZURE_CLIENT_SECRET = os.environ['AZURE_CLIENT_SECRET_MGMT']
-except KeyError as e:
-    logger.critical(f"Error Crítico: Falta variable de entorno esencial para Power Automate Management: {e}")
-    raise ValueError(f"Configuración incompleta para Power Automate Management: falta {e}")
+# Se leen y validan en el primer uso (no al importar): ejecutar_flow no las necesita y
+# una variable ARM ausente no debe impedir registrar el resto de acciones en frío.
+_ENV_ARM = {"suscripcion_id": "AZURE_SUBSCRIPTION_ID", "grupo_recurso": "AZURE_RESOURCE_GROUP", "client_id": "AZURE_CLIENT_ID_MGMT",
+            "tenant_id": "AZURE_TENANT_ID", "client_secret": "AZURE_CLIENT_SECRET_MGMT"}
+_config_arm_pa: Optional[Dict[str, str]] = None
+
+def _config_arm() -> Dict[str, str]:
+    """Devuelve la configuración ARM del entorno, validada una sola vez ('ubicacion' es opcional)."""
+    global _config_arm_pa
+    if _config_arm_pa is None:
+        faltantes = [var for var in _ENV_ARM.values() if var not in os.environ]
+        if faltantes:
+            logger.critical("Error Crítico: Faltan variables de entorno esenciales para Power Automate Management: %s", faltantes)
+            raise ValueError(f"Configuración incompleta para Power Automate Management: falta {', '.join(faltantes)}")
+        _config_arm_pa = {clave: os.environ[var] for clave, var in _ENV_ARM.items()}
+        _config_arm_pa["ubicacion"] = os.environ.get('AZURE_LOCATION', '')
+    return _config_arm_pa
 
 AZURE_MGMT_BASE_URL = "https://management.azure.com"
 AZURE_MGMT_SCOPE = "https://management.azure.com/.default"
 LOGIC_API_VERSION = "2019-05-01"
 AZURE_MGMT_TIMEOUT = max(GRAPH_API_TIMEOUT, 60)
+# (connect, read) para ejecutar_flow sin esperar respuesta: basta con que el trigger acepte la petición
+_TIMEOUT_DISPARO_S = (3.05, 3)
+# Endpoint /batch de ARM: varias sub-solicitudes en un solo POST (consume un único token de rate-limit).
+# Por encima de 20 sub-solicitudes ARM responde 202 y hay que sondear 'Location', así que se trocea.
+ARM_BATCH_API_VERSION = "2020-06-01"
+ARM_BATCH_MAX_SOLICITUDES = 20
+
+# --- Plantillas de URL ARM (parte invariante precalculada al cargar el módulo) ---
+_RUTA_WORKFLOWS = "/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows"
+_RUTA_RUN = _RUTA_WORKFLOWS + "/{name}/runs/{run_id}?api-version=" + LOGIC_API_VERSION # Relativa, para sub-solicitudes de /batch
+_RUTA_ULTIMA_RUN = _RUTA_WORKFLOWS + "/{name}/runs?$top=1&api-version=" + LOGIC_API_VERSION # Relativa, para sub-solicitudes de /batch
+_URL_LIST = AZURE_MGMT_BASE_URL + _RUTA_WORKFLOWS + "?api-version=" + LOGIC_API_VERSION
+_URL_ITEM = AZURE_MGMT_BASE_URL + _RUTA_WORKFLOWS + "/{name}?api-version=" + LOGIC_API_VERSION
+_URL_RUNS = AZURE_MGMT_BASE_URL + _RUTA_WORKFLOWS + "/{name}/runs?api-version=" + LOGIC_API_VERSION
+_URL_RUN = AZURE_MGMT_BASE_URL + _RUTA_RUN
+_URL_BATCH = AZURE_MGMT_BASE_URL + "/batch?api-version=" + ARM_BATCH_API_VERSION
+
+@lru_cache(maxsize=512)
+def _segmento_url(valor: str) -> str:
+    """Escapa un segmento de ruta ARM; memoizado porque suscripción, RG y nombres se repiten casi siempre."""
+    return quote(valor, safe='')
+
+def _url_arm(plantilla: str, **partes: Any) -> str:
+    """Rellena una plantilla de URL ARM escapando cada segmento (quote con safe='')."""
+    return plantilla.format_map({k: _segmento_url(str(v)) for k, v in partes.items()})
+
+# --- Sesión HTTP compartida para ARM ---
+# Pool keep-alive reutilizado por todas las llamadas del módulo (un solo handshake TLS
+# por conexión en lugar de uno por llamada). Reintenta solo métodos idempotentes ante
+# 429/5xx; raise_on_status=False deja que raise_for_status() reporte el último error HTTP.
+# POST queda fuera: el trigger de ejecutar_flow no es idempotente.
+class _RetryConJitter(Retry):
+    """Retry con backoff exponencial 'full jitter' (evita que los reintentos concurrentes se sincronicen)."""
+
+    def get_backoff_time(self) -> float:
+        return random.uniform(0, super().get_backoff_time())  # nosec B311 - no criptográfico
+
+_ARM_RETRY = _RetryConJitter(total=5, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+                             allowed_methods=frozenset(["GET", "PUT", "DELETE"]), respect_retry_after_header=True, raise_on_status=False)
+# Pool de hilos para consultas ARM en paralelo (I/O de red: los hilos liberan el GIL
+# mientras esperan y comparten las conexiones keep-alive de _ARM_SESSION).
+_ARM_MAX_WORKERS = 16
+# Tope global de llamadas ARM simultáneas (hilos del executor + hilos del host de Functions):
+# por encima de ~15-30 peticiones concurrentes ARM empieza a devolver 429.
+_ARM_MAX_CONCURRENCIA = 15
+_ARM_SEMAFORO_CONCURRENCIA = threading.BoundedSemaphore(_ARM_MAX_CONCURRENCIA)
+_ARM_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_executor_lock_arm = threading.Lock()
+
+def _executor_arm() -> ThreadPoolExecutor:
+    """Pool de hilos ARM, creado en el primer uso y no al importar (arranque en frío de workers que no lo usan)."""
+    global _ARM_EXECUTOR
+    if _ARM_EXECUTOR is None:
+        with _executor_lock_arm:
+            if _ARM_EXECUTOR is None: _ARM_EXECUTOR = ThreadPoolExecutor(max_workers=_ARM_MAX_WORKERS, thread_name_prefix="arm")
+    return _ARM_EXECUTOR
+# Conexiones por host: los workers del executor más holgura para los hilos del host de Functions.
+# pool_block=True acota los sockets abiertos contra ARM: en ráfagas se espera una conexión
+# keep-alive libre en vez de abrir (y tirar) conexiones extra, evitando agotar puertos SNAT.
+_ARM_POOL_MAXSIZE = _ARM_MAX_WORKERS * 2
+_ARM_SESSION = crear_sesion_http(pool_connections=10, pool_maxsize=_ARM_POOL_MAXSIZE, max_retries=_ARM_RETRY, pool_block=True,
+                                 socket_options=OPCIONES_SOCKET_KEEPALIVE)
+atexit.register(_ARM_SESSION.close) # Cierre ordenado de las conexiones del pool al apagar el worker
+
+# --- Sesión separada para triggers de flows (bulkhead) ---
+# ejecutar_flow llama a URLs de trigger arbitrarias: un trigger lento o colgado no debe ocupar
+# conexiones ni slots de concurrencia que necesitan las llamadas de gestión a ARM.
+# Sin reintentos (el POST de un trigger no es idempotente) y con timeout de conexión propio.
+_TRIGGER_SESSION = crear_sesion_http(pool_connections=5, pool_maxsize=10)
+_TIMEOUT_TRIGGER_S = (10, AZURE_MGMT_TIMEOUT) # (connect, read)
+atexit.register(_TRIGGER_SESSION.close)
+
+# Reglas de nombre ARM para Microsoft.Logic/workflows (1-80 caracteres: letras, dígitos, '-', '_', '.',
+# '(' y ')', en cualquier posición). Se valida en cliente para no gastar un round-trip a ARM en nombres
+# que la API rechazaría; fullmatch para que un salto de línea final no cuele.
+_ARM_NAME_RE = re.compile(r"[A-Za-z0-9._()\-]{1,80}")
+
+def _validar_flow(nombre_flow: Any, definicion_flow: Any = None, requiere_definicion: bool = False) -> None:
+    """Valida 'nombre_flow' (reglas ARM) y, si aplica, que 'definicion_flow' sea un dict no vacío."""
+    if not nombre_flow: raise ValueError("'nombre_flow' requerido.")
+    if not isinstance(nombre_flow, str) or not _ARM_NAME_RE.fullmatch(nombre_flow): raise ValueError(f"'nombre_flow' inválido: '{nombre_flow}'.")
+    if requiere_definicion and (not definicion_flow or not isinstance(definicion_flow, dict)): raise ValueError("'definicion_flow' (dict) requerido.")
+
+def _solo_definicion(definicion_flow: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Si se recibe un workflow completo (tal como lo devuelve obtener_flow), extrae solo
+    'properties.definition': id, createdTime, version, etc. son campos que fija el servidor.
+    """
+    propiedades = definicion_flow.get("properties")
+    if isinstance(propiedades, dict) and isinstance(propiedades.get("definition"), dict): return propiedades["definition"]
+    return definicion_flow
+
+def _destino_arm(parametros: Dict[str, Any]) -> Tuple[str, str]:
+    """Devuelve (suscripción, grupo de recursos) de los parámetros, con los defaults de entorno."""
+    config = _config_arm(); return parametros.get('suscripcion_id', config["suscripcion_id"]), parametros.get('grupo_recurso', config["grupo_recurso"])
+
+def _params_flow(parametros: Dict[str, Any], requiere_definicion: bool = False) -> Tuple[str, str, str]:
+    """Valida y extrae en una pasada (nombre_flow, suscripción, grupo de recursos)."""
+    _validar_flow(parametros.get("nombre_flow"), parametros.get("definicion_flow"), requiere_definicion)
+    nombre_flow: str = parametros["nombre_flow"]; sid, rg = _destino_arm(parametros); return nombre_flow, sid, rg
+
+def _validar_campos(campos: Any) -> Optional[List[str]]:
+    """Valida el parámetro opcional 'campos' (lista de nombres, admite rutas con punto)."""
+    if campos is not None and (not isinstance(campos, list) or not all(isinstance(c, str) and c for c in campos)): raise ValueError("'campos' debe ser una lista de nombres de campo.")
+    return campos
+
+def _proyectar(obj: Any, campos: List[str]) -> Dict[str, Any]:
+    """Devuelve solo los 'campos' pedidos de un recurso ARM (admite rutas con punto, ej. 'properties.state')."""
+    resultado: Dict[str, Any] = {}
+    for campo in campos:
+        origen, destino, partes = obj, resultado, campo.split(".")
+        for parte in partes[:-1]:
+            origen = origen.get(parte) if isinstance(origen, dict) else None
+            destino = destino.setdefault(parte, {})
+        destino[partes[-1]] = origen.get(partes[-1]) if isinstance(origen, dict) else None
+    return resultado
+
+# --- Caché de ubicación de workflows ---
+# actualizar_flow necesita 'location' para el PUT; cambia rarísima vez para un workflow dado,
+# así que se cachea (sid, rg, nombre) -> (location, instante) para evitar un GET previo.
+_LOCATION_CACHE: Dict[Tuple[str, str, str], Tuple[str, float]] = {}
+_LOCATION_TTL = 3600
+
+def _recordar_ubicacion(sid: str, rg: str, nombre_flow: str, flow: Any) -> None:
+    """Guarda la 'location' de un workflow devuelto por ARM en _LOCATION_CACHE."""
+    if isinstance(flow, dict) and flow.get("location"): _LOCATION_CACHE[(sid, rg, nombre_flow)] = (flow["location"], time.monotonic())
 
 # --- Helper de Autenticación (Específico para este módulo) ---
-_credential_pa: Optional[ClientSecretCredential] = None
+_credential_pa: Optional["ClientSecretCredential"] = None
 _cached_mgmt_token_pa: Optional[str] = None
+_expira_mgmt_token_pa: float = 0.0 # expires_on (epoch) del token cacheado
+_MARGEN_RENOVACION_TOKEN_S = 300 # Renovar con 5 min de margen: evita usar un token que caduque en mitad de un lote o sondeo
+_token_lock_pa = threading.Lock()
+# Cabeceras ARM construidas una sola vez por token (solo lectura, compartidas entre llamadas)
+_cached_mgmt_headers_pa: Optional[Mapping[str, str]] = None
+_token_headers_pa: Optional[str] = None
 
 def _get_azure_mgmt_token() -> str:
-    """Obtiene un token de acceso para Azure Management API."""
-    global _credential_pa, _cached_mgmt_token_pa
+    """Obtiene un token de acceso para Azure Management API (cacheado hasta poco antes de expirar)."""
+    global _credential_pa, _cached_mgmt_token_pa, _expira_mgmt_token_pa
 
-    # Verificar si azure-identity se importó correctamente (ya no es necesario el mock check)
-    # if ClientSecretCredential is None:
-    #     raise ImportError("Módulo azure.identity no disponible.")
+    # Camino rápido sin lock: el token se escribe antes que su expiración, así que una expiración
+    # vigente implica que el token leído justo después ya es el nuevo
+    expira, token = _expira_mgmt_token_pa, _cached_mgmt_token_pa
+    if token and expira - time.time() > _MARGEN_RENOVACION_TOKEN_S: return token
 
-    if _cached_mgmt_token_pa: return _cached_mgmt_token_pa
+    # El lock evita que varias invocaciones concurrentes pidan token a AAD a la vez
+    with _token_lock_pa:
+        if _cached_mgmt_token_pa and _expira_mgmt_token_pa - time.time() > _MARGEN_RENOVACION_TOKEN_S: return _cached_mgmt_token_pa # Otro hilo ya renovó
 
-    if not _credential_pa:
-        logger.info("Creando credencial ClientSecretCredential para Azure Management (PA).")
         try:
-            _credential_pa = ClientSecretCredential(tenant_id=AZURE_TENANT_ID, client_id=AZURE_CLIENT_ID, client_secret=AZURE_CLIENT_SECRET)
-        except Exception as cred_err:
-             logger.critical(f"Error al crear ClientSecretCredential (PA): {cred_err}", exc_info=True)
-             raise Exception(f"Error configurando credencial Azure (PA): {cred_err}") from cred_err
+            from azure.identity import ClientSecretCredential, CredentialUnavailableError
+        except ImportError as imp_err:
+            logger.critical("Módulo azure.identity no disponible para Power Automate Management: %s", imp_err)
+            raise ImportError("Se requiere 'azure-identity' para las acciones de Power Automate Management.") from imp_err
 
-    try:
-        logger.info(f"Solicitando token para Azure Management con scope: {AZURE_MGMT_SCOPE}")
-        if _credential_pa is None: raise Exception("Credencial PA no inicializada.")
-        token_info = _credential_pa.get_token(AZURE_MGMT_SCOPE)
-        _cached_mgmt_token_pa = token_info.token
-        logger.info("Token para Azure Management (PA) obtenido.")
-        return _cached_mgmt_token_pa
-    except CredentialUnavailableError as cred_err:
-         logger.critical(f"Credencial no disponible para obtener token ARM: {cred_err}", exc_info=True)
-         raise Exception(f"Credencial Azure (PA) no disponible: {cred_err}") from cred_err
-    except Exception as e:
-        logger.error(f"Error inesperado obteniendo token ARM (PA): {e}", exc_info=True)
-        raise Exception(f"Error obteniendo token Azure (PA): {e}") from e
+        if not _credential_pa:
+            logger.info("Creando credencial ClientSecretCredential para Azure Management (PA).")
+            config = _config_arm()
+            try:
+                _credential_pa = ClientSecretCredential(tenant_id=config["tenant_id"], client_id=config["client_id"], client_secret=config["client_secret"])
+            except Exception as cred_err:
+                 logger.critical("Error al crear ClientSecretCredential (PA): %s", cred_err, exc_info=True)
+                 raise Exception(f"Error configurando credencial Azure (PA): {cred_err}") from cred_err
 
-def _get_auth_headers_for_mgmt() -> Dict[str, str]:
-    """Construye las cabeceras de autenticación para ARM API."""
+        try:
+            logger.info("Solicitando token para Azure Management con scope: %s", AZURE_MGMT_SCOPE)
+            if _credential_pa is None: raise Exception("Credencial PA no inicializada.")
+            token_info = _credential_pa.get_token(AZURE_MGMT_SCOPE)
+            _cached_mgmt_token_pa = token_info.token
+            _expira_mgmt_token_pa = float(token_info.expires_on)
+            logger.info("Token para Azure Management (PA) obtenido.")
+            return _cached_mgmt_token_pa
+        except CredentialUnavailableError as cred_err:
+             logger.critical("Credencial no disponible para obtener token ARM: %s", cred_err, exc_info=True)
+             raise Exception(f"Credencial Azure (PA) no disponible: {cred_err}") from cred_err
+        except Exception as e:
+            logger.error("Error inesperado obteniendo token ARM (PA): %s", e, exc_info=True)
+            raise Exception(f"Error obteniendo token Azure (PA): {e}") from e
+
+def _get_auth_headers_for_mgmt() -> Mapping[str, str]:
+    """Devuelve las cabeceras de autenticación para ARM API, reconstruidas solo cuando cambia el token."""
+    global _cached_mgmt_headers_pa, _token_headers_pa
     try:
         token = _get_azure_mgmt_token()
-        return {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
     except Exception as e:
         raise Exception(f"No se pudieron obtener cabeceras auth para Management API: {e}") from e
+    if _cached_mgmt_headers_pa is None or token != _token_headers_pa:
+        _cached_mgmt_headers_pa = MappingProxyType({'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'})
+        _token_headers_pa = token
+    return _cached_mgmt_headers_pa
+
+def _renovar_auth_mgmt(rechazadas: Mapping[str, str]) -> Mapping[str, str]:
+    """
+    Invalida el token ARM de las cabeceras 'rechazadas' (401) si sigue cacheado y devuelve cabeceras con uno nuevo.
+
+    ClientSecretCredential tiene su propia caché y devolvería el mismo token hasta ~5 min antes de
+    caducar: se descarta la credencial para que la siguiente petición obtenga de verdad uno nuevo.
+    """
+    global _credential_pa, _expira_mgmt_token_pa
+    with _token_lock_pa:
+        if rechazadas.get("Authorization") == f"Bearer {_cached_mgmt_token_pa}": # Si otro hilo ya lo renovó tras el mismo 401, no pedir otro
+            _credential_pa = None
+            _expira_mgmt_token_pa = 0.0
+    return _get_auth_headers_for_mgmt()
+
+class _CircuitoARM:
+    """
+    Circuit breaker mínimo para ARM: tras 'fallos_max' fallos seguidos (429/5xx/red, ya agotados
+    los reintentos del adaptador) rechaza llamadas durante 'reinicio_s' segundos; pasado ese tiempo
+    deja pasar una sola llamada de prueba que cierra el circuito o lo vuelve a abrir.
+    """
+
+    def __init__(self, fallos_max: int = 5, reinicio_s: float = 30.0) -> None:
+        self._fallos_max = fallos_max
+        self._reinicio_s = reinicio_s
+        self._fallos = 0
+        self._abierto_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def antes(self) -> None:
+        with self._lock:
+            if self._fallos < self._fallos_max: return
+            ahora = time.monotonic()
+            if ahora < self._abierto_hasta: raise Exception(f"Circuito ARM abierto tras {self._fallos} fallos consecutivos; reintentar en {self._abierto_hasta - ahora:.0f}s.")
+            self._abierto_hasta = ahora + self._reinicio_s # Semiabierto: solo esta llamada hace de prueba
+
+    def exito(self) -> None:
+        with self._lock: self._fallos = 0
+
+    def fallo(self) -> None:
+        with self._lock:
+            self._fallos += 1
+            if self._fallos >= self._fallos_max: self._abierto_hasta = time.monotonic() + self._reinicio_s
+
+_circuito_arm = _CircuitoARM()
+
+def _llamada_arm(metodo: str, url: str, auth_headers: Mapping[str, str], **kwargs: Any) -> Any:
+    """hacer_llamada_api sobre la sesión ARM compartida, con renovación del token ante 401, concurrencia acotada y circuit breaker."""
+    kwargs.setdefault("timeout", AZURE_MGMT_TIMEOUT)
+    _circuito_arm.antes()
+    try:
+        with _ARM_SEMAFORO_CONCURRENCIA:
+            resultado = hacer_llamada_api(metodo, url, auth_headers, session=_ARM_SESSION, renovar_auth=_renovar_auth_mgmt, **kwargs)
+    except requests.exceptions.RequestException as e:
+        estado = e.response.status_code if e.response is not None else None
+        # Un 4xx (salvo 429) es una respuesta válida del servicio: no cuenta como fallo del circuito
+        if estado is None or estado == 429 or estado >= 500: _circuito_arm.fallo()
+        else: _circuito_arm.exito()
+        raise
+    _circuito_arm.exito(); return resultado
 
 # ========================================================
 # ==== FUNCIONES DE ACCIÓN PARA POWER AUTOMATE (FLOWS) ====
 # ========================================================
-# (Funciones listar_flows, obtener_flow, crear_flow, actualizar_flow,
-#  eliminar_flow, ejecutar_flow sin cambios funcionales respecto a v2)
+
+def _query_listado(parametros: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Traduce 'top' y 'filtro' (ej. "State eq 'Enabled'") a los $top/$filter que ARM aplica en servidor."""
+    query: Dict[str, Any] = {}
+    if parametros.get("top"): query["$top"] = int(parametros["top"])
+    if parametros.get("filtro"): query["$filter"] = parametros["filtro"]
+    return query or None
+
+def iterar_flows(parametros: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Genera los workflows página a página siguiendo 'nextLink' (en memoria solo la página en curso)."""
+    sid, rg = _destino_arm(parametros); campos = _validar_campos(parametros.get("campos")); query = _query_listado(parametros)
+    url: Optional[str] = _url_arm(_URL_LIST, sid=sid, rg=rg)
+    logger.info("Iterando flows en Sub '%s', RG '%s'", sid, rg)
+    while url:
+        with sesion_arm() as auth_headers: pagina = _llamada_arm("GET", url, auth_headers, params=query) or {}
+        for flow in pagina.get("value", []): yield _proyectar(flow, campos) if campos else flow
+        url = pagina.get("nextLink"); query = None # nextLink ya incluye la query original
 
 def listar_flows(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    auth_headers = _get_auth_headers_for_mgmt(); sid = parametros.get('suscripcion_id', AZURE_SUBSCRIPTION_ID); rg = parametros.get('grupo_recurso', AZURE_RESOURCE_GROUP)
-    url = f"{AZURE_MGMT_BASE_URL}/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows?api-version={LOGIC_API_VERSION}"
-    logger.info(f"Listando flows en Sub '{sid}', RG '{rg}'"); return hacer_llamada_api("GET", url, auth_headers, timeout=AZURE_MGMT_TIMEOUT)
+    """
+    Lista los flows del grupo de recursos. Opcionales: 'top' y 'filtro' ($top/$filter en ARM), 'campos'
+    (proyección de cada flow) y 'todas_las_paginas' (sigue 'nextLink' y devuelve todos en 'value').
+    """
+    if parametros.get("todas_las_paginas"): return {"value": list(iterar_flows(parametros))}
+    sid, rg = _destino_arm(parametros); campos = _validar_campos(parametros.get("campos")); auth_headers = _get_auth_headers_for_mgmt()
+    url = _url_arm(_URL_LIST, sid=sid, rg=rg)
+    logger.info("Listando flows en Sub '%s', RG '%s'", sid, rg); listado = _llamada_arm("GET", url, auth_headers, params=_query_listado(parametros))
+    if campos and listado: listado["value"] = [_proyectar(flow, campos) for flow in listado.get("value", [])]
+    return listado
 
 def obtener_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    nombre_flow: Optional[str] = parametros.get("nombre_flow");
-    if not nombre_flow: raise ValueError("'nombre_flow' requerido.")
-    auth_headers = _get_auth_headers_for_mgmt(); sid = parametros.get('suscripcion_id', AZURE_SUBSCRIPTION_ID); rg = parametros.get('grupo_recurso', AZURE_RESOURCE_GROUP)
-    url = f"{AZURE_MGMT_BASE_URL}/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows/{nombre_flow}?api-version={LOGIC_API_VERSION}"
-    logger.info(f"Obteniendo flow '{nombre_flow}' en RG '{rg}'"); return hacer_llamada_api("GET", url, auth_headers, timeout=AZURE_MGMT_TIMEOUT)
+    """Obtiene un flow. Con 'campos' (lista) devuelve solo esos campos en lugar del recurso completo con su definición."""
+    nombre_flow, sid, rg = _params_flow(parametros); campos = _validar_campos(parametros.get("campos")); auth_headers = _get_auth_headers_for_mgmt()
+    url = _url_arm(_URL_ITEM, sid=sid, rg=rg, name=nombre_flow)
+    logger.info("Obteniendo flow '%s' en RG '%s'", nombre_flow, rg); flow = _llamada_arm("GET", url, auth_headers)
+    _recordar_ubicacion(sid, rg, nombre_flow, flow); return _proyectar(flow, campos) if campos else flow
 
 def crear_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    nombre_flow: Optional[str] = parametros.get("nombre_flow"); definicion_flow: Optional[Dict[str, Any]] = parametros.get("definicion_flow"); ubicacion: Optional[str] = parametros.get("ubicacion", AZURE_LOCATION)
-    if not nombre_flow: raise ValueError("'nombre_flow' requerido.");
-    if not definicion_flow or not isinstance(definicion_flow, dict): raise ValueError("'definicion_flow' (dict) requerido.")
+    nombre_flow, sid, rg = _params_flow(parametros, requiere_definicion=True); definicion_flow = _solo_definicion(parametros["definicion_flow"]); ubicacion: Optional[str] = parametros.get("ubicacion", _config_arm()["ubicacion"])
     if not ubicacion: raise ValueError("Se requiere 'ubicacion' o AZURE_LOCATION.")
-    auth_headers = _get_auth_headers_for_mgmt(); sid = parametros.get('suscripcion_id', AZURE_SUBSCRIPTION_ID); rg = parametros.get('grupo_recurso', AZURE_RESOURCE_GROUP)
-    url = f"{AZURE_MGMT_BASE_URL}/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows/{nombre_flow}?api-version={LOGIC_API_VERSION}"
+    auth_headers = _get_auth_headers_for_mgmt()
+    url = _url_arm(_URL_ITEM, sid=sid, rg=rg, name=nombre_flow)
     body: Dict[str, Any] = {"location": ubicacion, "properties": {"definition": definicion_flow}}
-    logger.info(f"Creando flow '{nombre_flow}' en RG '{rg}', Loc '{ubicacion}'"); return hacer_llamada_api("PUT", url, auth_headers, json_data=body, timeout=AZURE_MGMT_TIMEOUT * 2)
+    logger.info("Creando flow '%s' en RG '%s', Loc '%s'", nombre_flow, rg, ubicacion); flow = _llamada_arm("PUT", url, auth_headers, json_data=body, timeout=AZURE_MGMT_TIMEOUT * 2)
+    _recordar_ubicacion(sid, rg, nombre_flow, flow); return flow
 
 def actualizar_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    nombre_flow: Optional[str] = parametros.get("nombre_flow"); definicion_flow: Optional[Dict[str, Any]] = parametros.get("definicion_flow")
-    if not nombre_flow: raise ValueError("'nombre_flow' requerido.");
-    if not definicion_flow or not isinstance(definicion_flow, dict): raise ValueError("'definicion_flow' (dict) requerido.")
-    auth_headers = _get_auth_headers_for_mgmt(); sid = parametros.get('suscripcion_id', AZURE_SUBSCRIPTION_ID); rg = parametros.get('grupo_recurso', AZURE_RESOURCE_GROUP)
-    try:
-        params_get = {"nombre_flow": nombre_flow, "suscripcion_id": sid, "grupo_recurso": rg}; current_flow = obtener_flow(params_get, {})
-        current_location = current_flow.get("location");
-        if not current_location: raise ValueError("No se pudo obtener ubicación del flow existente.")
-    except Exception as get_err: raise Exception(f"No se pudo obtener flow actual '{nombre_flow}' para actualizar: {get_err}") from get_err
-    url = f"{AZURE_MGMT_BASE_URL}/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows/{nombre_flow}?api-version={LOGIC_API_VERSION}"
+    nombre_flow, sid, rg = _params_flow(parametros, requiere_definicion=True); definicion_flow = _solo_definicion(parametros["definicion_flow"])
+    auth_headers = _get_auth_headers_for_mgmt()
+    entrada = _LOCATION_CACHE.get((sid, rg, nombre_flow)); current_location: Optional[str]
+    if entrada and time.monotonic() - entrada[1] < _LOCATION_TTL: current_location = entrada[0]
+    else: # Solo sin caché: un GET de la 'location' (PUT completo; Workflows - Update no reemplaza la definición)
+        try:
+            params_get = {"nombre_flow": nombre_flow, "suscripcion_id": sid, "grupo_recurso": rg, "campos": ["location"]}; current_flow = obtener_flow(params_get, {})
+            current_location = current_flow.get("location")
+            if not current_location: raise ValueError("No se pudo obtener ubicación del flow existente.")
+        except Exception as get_err: raise Exception(f"No se pudo obtener flow actual '{nombre_flow}' para actualizar: {get_err}") from get_err
+    url = _url_arm(_URL_ITEM, sid=sid, rg=rg, name=nombre_flow)
     body: Dict[str, Any] = {"location": current_location, "properties": {"definition": definicion_flow}}
-    logger.info(f"Actualizando flow '{nombre_flow}' en RG '{rg}'"); return hacer_llamada_api("PUT", url, auth_headers, json_data=body, timeout=AZURE_MGMT_TIMEOUT * 2)
+    logger.info("Actualizando flow '%s' en RG '%s'", nombre_flow, rg); flow = _llamada_arm("PUT", url, auth_headers, json_data=body, timeout=AZURE_MGMT_TIMEOUT * 2)
+    _recordar_ubicacion(sid, rg, nombre_flow, flow); return flow
 
 def eliminar_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    nombre_flow: Optional[str] = parametros.get("nombre_flow");
-    if not nombre_flow: raise ValueError("'nombre_flow' requerido.")
-    auth_headers = _get_auth_headers_for_mgmt(); sid = parametros.get('suscripcion_id', AZURE_SUBSCRIPTION_ID); rg = parametros.get('grupo_recurso', AZURE_RESOURCE_GROUP)
-    url = f"{AZURE_MGMT_BASE_URL}/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows/{nombre_flow}?api-version={LOGIC_API_VERSION}"
-    logger.info(f"Eliminando flow '{nombre_flow}' de RG '{rg}'"); hacer_llamada_api("DELETE", url, auth_headers, timeout=AZURE_MGMT_TIMEOUT); return {"status": "Eliminado", "flow": nombre_flow}
+    """Elimina un flow. Un 404 (ya no existe) se trata como eliminado salvo 'ignorar_inexistente'=False."""
+    nombre_flow, sid, rg = _params_flow(parametros); ignorar_inexistente: bool = parametros.get("ignorar_inexistente", True) is not False; auth_headers = _get_auth_headers_for_mgmt()
+    url = _url_arm(_URL_ITEM, sid=sid, rg=rg, name=nombre_flow)
+    logger.info("Eliminando flow '%s' de RG '%s'", nombre_flow, rg)
+    try: _llamada_arm("DELETE", url, auth_headers)
+    except requests.exceptions.HTTPError as e:
+        if not (ignorar_inexistente and e.response is not None and e.response.status_code == 404): raise
+        _LOCATION_CACHE.pop((sid, rg, nombre_flow), None)
+        logger.info("Flow '%s' no existe en RG '%s'; nada que eliminar.", nombre_flow, rg); return {"status": "Eliminado", "flow": nombre_flow, "code": 404, "noop": True}
+    _LOCATION_CACHE.pop((sid, rg, nombre_flow), None); return {"status": "Eliminado", "flow": nombre_flow}
+
+def eliminar_flows(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Elimina en paralelo varios flows ('nombres_flow'). 'suscripcion_id', 'grupo_recurso' e
+    'ignorar_inexistente' aplican a todos; un fallo individual se reporta en su elemento.
+    """
+    nombres_flow: Optional[List[str]] = parametros.get("nombres_flow")
+    if not nombres_flow or not isinstance(nombres_flow, list): raise ValueError("'nombres_flow' (lista) requerido.")
+    for nombre_flow in nombres_flow: _validar_flow(nombre_flow)
+    comunes: Dict[str, Any] = {k: parametros[k] for k in ('suscripcion_id', 'grupo_recurso', 'ignorar_inexistente') if k in parametros}
+    logger.info("Eliminando %s flows en paralelo", len(nombres_flow))
+    futuros = [_executor_arm().submit(eliminar_flow, {**comunes, "nombre_flow": nombre_flow}, headers) for nombre_flow in nombres_flow]
+    resultados: List[Dict[str, Any]] = []
+    for nombre_flow, futuro in zip(nombres_flow, futuros):
+        try: resultados.append(futuro.result())
+        except Exception as e: logger.warning("Fallo eliminando flow '%s': %s", nombre_flow, e); resultados.append({"status": "Fallido", "flow": nombre_flow, "error": str(e)})
+    return {"value": resultados}
 
 def ejecutar_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    flow_url: Optional[str] = parametros.get("flow_url"); payload: Optional[Dict[str, Any]] = parametros.get("payload")
+    """Dispara un flow por su URL de trigger. Con 'esperar_respuesta'=False solo espera a que el trigger acepte la petición."""
+    flow_url: Optional[str] = parametros.get("flow_url"); payload: Optional[Dict[str, Any]] = parametros.get("payload"); esperar: bool = parametros.get("esperar_respuesta", True) is not False
     if not flow_url: raise ValueError("'flow_url' requerido.")
     request_headers = headers.copy();
     if payload: request_headers['Content-Type'] = 'application/json'
-    logger.info(f"Ejecutando trigger de flow: POST {flow_url}")
+    logger.info("Ejecutando trigger de flow: POST %s", flow_url)
     try:
-        response = requests.post(flow_url, headers=request_headers, json=payload if payload else None, timeout=AZURE_MGMT_TIMEOUT)
-        response.raise_for_status(); logger.info(f"Trigger flow '{flow_url}' ejecutado. Status: {response.status_code}")
-        try: resp_data = response.json()
+        response = _TRIGGER_SESSION.post(flow_url, headers=request_headers, data=escribir_json(payload) if payload else None, timeout=_TIMEOUT_TRIGGER_S if esperar else _TIMEOUT_DISPARO_S)
+        response.raise_for_status(); logger.info("Trigger flow '%s' ejecutado. Status: %s", flow_url, response.status_code)
+        if not esperar and response.status_code == 202:
+            return {"status": "En ejecución", "status_code": 202, "poll_url": response.headers.get("Location") or response.headers.get("Azure-AsyncOperation")}
+        try: resp_data = leer_json(response)
         except json.JSONDecodeError: resp_data = response.text
         return {"status": "Ejecutado" if response.ok else "Fallido", "status_code": response.status_code, "response_body": resp_data}
-    except requests.exceptions.RequestException as e: error_body = e.response.text[:200] if e.response else "N/A"; logger.error(f"Error Request ejecutando trigger flow '{flow_url}': {e}. Respuesta: {error_body}", exc_info=True); raise Exception(f"Error API ejecutando trigger flow: {e}") from e
-    except Exception as e: logger.error(f"Error inesperado ejecutando trigger flow '{flow_url}': {e}", exc_info=True); raise
+    except requests.exceptions.ReadTimeout as e:
+        if esperar: logger.error("Timeout ejecutando trigger flow '%s': %s", flow_url, e); raise Exception(f"Error API ejecutando trigger flow: {e}") from e
+        logger.info("Trigger flow '%s' enviado; no se espera su respuesta.", flow_url); return {"status": "Enviado", "status_code": None, "poll_url": None}
+    except requests.exceptions.RequestException as e: error_body = e.response.text[:200] if e.response is not None else "N/A"; logger.error("Error Request ejecutando trigger flow '%s': %s. Respuesta: %s", flow_url, e, error_body, exc_info=logger.isEnabledFor(logging.DEBUG)); raise Exception(f"Error API ejecutando trigger flow: {e}") from e
+    except Exception as e: logger.error("Error inesperado ejecutando trigger flow '%s': %s", flow_url, e, exc_info=logger.isEnabledFor(logging.DEBUG)); raise
 
-def obtener_estado_ejecucion_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    """Obtiene el estado de una ejecución (run) específica de un flujo."""
-    nombre_flow: Optional[str] = parametros.get("nombre_flow")
+@contextmanager
+def sesion_arm() -> Iterator[Mapping[str, str]]:
+    """Resuelve las cabeceras ARM una vez para un bloque de llamadas (bucles de sondeo, lotes)."""
+    yield _get_auth_headers_for_mgmt()
+
+def _params_ejecucion(parametros: Dict[str, Any]) -> Tuple[str, str, str, str]:
+    """Valida y extrae (nombre_flow, suscripción, grupo de recursos, run_id) de una consulta de ejecución."""
+    nombre_flow, sid, rg = _params_flow(parametros)
     run_id: Optional[str] = parametros.get("run_id")
 
     # Corrección Flake8 E999: Separar los if/raise en líneas distintas
-    if not nombre_flow:
-        raise ValueError("'nombre_flow' es requerido.")
     if not run_id:
         raise ValueError("'run_id' es requerido.")
+    return nombre_flow, sid, rg, run_id
+
+def _obtener_estado_ejecucion_con_headers(parametros: Dict[str, Any], auth_headers: Mapping[str, str]) -> Dict[str, Any]:
+    """Como obtener_estado_ejecucion_flow, pero con cabeceras ARM ya resueltas (ver sesion_arm)."""
+    nombre_flow, sid, rg, run_id = _params_ejecucion(parametros)
+    url = _url_arm(_URL_RUN, sid=sid, rg=rg, name=nombre_flow, run_id=run_id)
+    logger.info("Obteniendo estado de ejecución '%s' flow '%s'", run_id, nombre_flow)
+    return _llamada_arm("GET", url, auth_headers)
+
+def obtener_estado_ejecucion_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Obtiene el estado de una ejecución (run) específica de un flujo."""
+    # Opt-in: agrupar con otras consultas concurrentes en un único POST /batch
+    if parametros.get("agrupar"):
+        _params_ejecucion(parametros)
+        return _agrupador_estados.consultar(parametros)
+
+    with sesion_arm() as auth_headers:
+        return _obtener_estado_ejecucion_con_headers(parametros, auth_headers)
+
+def obtener_estados_ejecucion_flows(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Obtiene en paralelo el estado de varias ejecuciones (runs).
+
+    'ejecuciones' es una lista de {'nombre_flow': ..., 'run_id': ...}; 'suscripcion_id' y
+    'grupo_recurso' (opcionales) aplican a todas. Un fallo individual no aborta el resto:
+    se reporta en la clave 'error' de su elemento.
+    """
+    ejecuciones: Optional[List[Dict[str, Any]]] = parametros.get("ejecuciones")
+    if not ejecuciones or not isinstance(ejecuciones, list) or not all(isinstance(e, dict) for e in ejecuciones):
+        raise ValueError("'ejecuciones' (lista de {'nombre_flow', 'run_id'}) requerido.")
+    comunes: Dict[str, Any] = {k: parametros[k] for k in ('suscripcion_id', 'grupo_recurso') if k in parametros}
 
+    logger.info("Obteniendo estado de %s ejecuciones en paralelo", len(ejecuciones))
+    with sesion_arm() as auth_headers:
+        futuros = [_executor_arm().submit(_obtener_estado_ejecucion_con_headers, {**comunes, **ejecucion}, auth_headers) for ejecucion in ejecuciones]
+    resultados: List[Dict[str, Any]] = []
+    for ejecucion, futuro in zip(ejecuciones, futuros):
+        item: Dict[str, Any] = {"nombre_flow": ejecucion.get("nombre_flow"), "run_id": ejecucion.get("run_id")}
+        try: item["estado"] = futuro.result()
+        except Exception as e: logger.warning("Fallo obteniendo estado de ejecución '%s' flow '%s': %s", item['run_id'], item['nombre_flow'], e); item["error"] = str(e)
+        resultados.append(item)
+    return {"value": resultados}
+
+def enviar_consultas_estado(ejecuciones: List[Tuple[str, str]], parametros: Optional[Dict[str, Any]] = None) -> Dict["Future[Dict[str, Any]]", Tuple[str, str]]:
+    """
+    Lanza en el executor ARM la consulta de estado de cada (nombre_flow, run_id) y devuelve
+    {Future: (nombre_flow, run_id)} para consumir con as_completed a medida que terminan.
+    'parametros' (opcional) aporta 'suscripcion_id'/'grupo_recurso' comunes.
+    """
+    comunes: Dict[str, Any] = {k: v for k, v in (parametros or {}).items() if k in ('suscripcion_id', 'grupo_recurso')}
+    with sesion_arm() as auth_headers:
+        return {_executor_arm().submit(_obtener_estado_ejecucion_con_headers, {**comunes, "nombre_flow": nombre_flow, "run_id": run_id}, auth_headers): (nombre_flow, run_id)
+                for nombre_flow, run_id in ejecuciones}
+
+def obtener_estados_por_run(ejecuciones: List[Tuple[str, str]], parametros: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+    """Consulta en paralelo varias ejecuciones y devuelve {run_id: {'estado': ...} | {'error': ...}}."""
+    resultados: Dict[str, Dict[str, Any]] = {}
+    futuros = enviar_consultas_estado(ejecuciones, parametros)
+    for futuro in as_completed(futuros):
+        nombre_flow, run_id = futuros[futuro]
+        try: resultados[run_id] = {"estado": futuro.result()}
+        except Exception as e: logger.warning("Fallo obteniendo estado de ejecución '%s' flow '%s': %s", run_id, nombre_flow, e); resultados[run_id] = {"error": str(e)}
+    return resultados
+
+def _ejecutar_lote_arm(solicitudes: List[Dict[str, Any]], auth_headers: Mapping[str, str]) -> List[Dict[str, Any]]:
+    """Envía un lote al endpoint /batch de ARM y devuelve su lista 'responses' (sondeando 'Location' si responde 202)."""
+    url = _URL_BATCH
+    response = _llamada_arm("POST", url, auth_headers, json_data={"requests": solicitudes}, expect_json=False)
+    limite = time.monotonic() + AZURE_MGMT_TIMEOUT * 2
+    while response.status_code == 202:
+        location = response.headers.get("Location")
+        if not location: raise Exception("Lote ARM aceptado (202) sin cabecera 'Location' para sondear.")
+        if time.monotonic() > limite: raise Exception(f"Timeout esperando resultado del lote ARM ({len(solicitudes)} solicitudes).")
+        time.sleep(segundos_retry_after(response, 1.0)) # Puede venir como fecha HTTP
+        response = _llamada_arm("GET", location, auth_headers, expect_json=False)
+    return leer_json(response).get("responses", [])
+
+def _resolver_lotes_arm(solicitudes: List[Dict[str, Any]], auth_headers: Mapping[str, str]) -> Dict[str, Tuple[Any, Optional[str]]]:
+    """
+    Resuelve sub-solicitudes ARM en lotes de ARM_BATCH_MAX_SOLICITUDES enviados en paralelo.
+    Devuelve {name: (contenido, error)}; un lote fallido marca con error solo sus sub-solicitudes.
+    """
+    lotes = [solicitudes[i:i + ARM_BATCH_MAX_SOLICITUDES] for i in range(0, len(solicitudes), ARM_BATCH_MAX_SOLICITUDES)]
+    resultados: Dict[str, Tuple[Any, Optional[str]]] = {sol["name"]: (None, "Sin respuesta en el lote ARM.") for sol in solicitudes}
+    futuros = [(lote, _executor_arm().submit(_ejecutar_lote_arm, lote, auth_headers)) for lote in lotes]
+    for lote, futuro in futuros:
+        try: respuestas = futuro.result()
+        except Exception as e: logger.warning("Fallo en lote ARM /batch (%s solicitudes): %s", len(lote), e); resultados.update({sol["name"]: (None, str(e)) for sol in lote}); continue
+        for respuesta in respuestas:
+            estado = int(respuesta.get("httpStatusCode", 0))
+            resultados[str(respuesta.get("name"))] = (respuesta.get("content"), None) if 200 <= estado < 300 else (None, f"HTTP {estado}: {respuesta.get('content')}")
+    return resultados
+
+def obtener_estados_batch(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Obtiene el estado de varias ejecuciones (runs) mediante el endpoint /batch de ARM.
+
+    Mismo formato de entrada y salida que obtener_estados_ejecucion_flows, pero agrupa los GET
+    en lotes de ARM_BATCH_MAX_SOLICITUDES (un round-trip por lote, lotes en paralelo).
+    """
+    ejecuciones: Optional[List[Dict[str, Any]]] = parametros.get("ejecuciones")
+    if not ejecuciones or not isinstance(ejecuciones, list) or not all(isinstance(e, dict) for e in ejecuciones):
+        raise ValueError("'ejecuciones' (lista de {'nombre_flow', 'run_id'}) requerido.")
+    solicitudes: List[Dict[str, Any]] = []
+    for ejecucion in ejecuciones:
+        nombre_flow, sid, rg, run_id = _params_ejecucion({**parametros, **ejecucion})
+        url = _url_arm(_RUTA_RUN, sid=sid, rg=rg, name=nombre_flow, run_id=run_id)
+        solicitudes.append({"httpMethod": "GET", "name": uuid.uuid4().hex, "url": url})
     auth_headers = _get_auth_headers_for_mgmt()
-    sid = parametros.get('suscripcion_id', AZURE_SUBSCRIPTION_ID)
-    rg = parametros.get('grupo_recurso', AZURE_RESOURCE_GROUP)
 
-    url = f"{AZURE_MGMT_BASE_URL}/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows/{nombre_flow}/runs/{run_id}?api-version={LOGIC_API_VERSION}"
-    logger.info(f"Obteniendo estado de ejecución '{run_id}' flow '{nombre_flow}'")
-    return hacer_llamada_api("GET", url, auth_headers, timeout=AZURE_MGMT_TIMEOUT)
+    logger.info("Obteniendo estado de %s ejecuciones vía ARM /batch", len(solicitudes))
+    respuestas = _resolver_lotes_arm(solicitudes, auth_headers)
+
+    resultados: List[Dict[str, Any]] = []
+    for ejecucion, sol in zip(ejecuciones, solicitudes):
+        item: Dict[str, Any] = {"nombre_flow": ejecucion["nombre_flow"], "run_id": ejecucion["run_id"]}
+        contenido, error = respuestas[sol["name"]]
+        if error: item["error"] = error
+        else: item["estado"] = contenido
+        resultados.append(item)
+    return {"value": resultados}
+
+def listar_flows_con_detalles(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Lista los flows y añade a cada uno su última ejecución ('ultima_ejecucion'), consultadas en lotes ARM /batch."""
+    sid, rg = _destino_arm(parametros)
+    listado = listar_flows(parametros, headers) or {}
+    flows: List[Dict[str, Any]] = [f for f in listado.get("value", []) if f.get("name")]
+    if not flows: return listado
+    solicitudes = [{"httpMethod": "GET", "name": uuid.uuid4().hex, "url": _url_arm(_RUTA_ULTIMA_RUN, sid=sid, rg=rg, name=f["name"])} for f in flows]
+    logger.info("Enriqueciendo %s flows con su última ejecución vía ARM /batch", len(flows))
+    with sesion_arm() as auth_headers: respuestas = _resolver_lotes_arm(solicitudes, auth_headers)
+    for flow, sol in zip(flows, solicitudes):
+        contenido, error = respuestas[sol["name"]]
+        if error: logger.warning("Fallo obteniendo última ejecución de flow '%s': %s", flow["name"], error); flow["error_ultima_ejecucion"] = error
+        else: runs = (contenido or {}).get("value", []); flow["ultima_ejecucion"] = runs[0] if runs else None
+    return listado
+
+# --- Agrupador de consultas de estado (micro-batching) ---
+BATCH_MAX_SIZE = ARM_BATCH_MAX_SOLICITUDES
+BATCH_MAX_WAIT_MS = 100
+
+class _AgrupadorEstados:
+    """
+    Junta las consultas de estado que llegan desde distintos hilos en una ventana de
+    BATCH_MAX_WAIT_MS (o hasta BATCH_MAX_SIZE) y las resuelve con un solo POST /batch.
+    """
+
+    def __init__(self) -> None:
+        self._cola: "queue.Queue[Tuple[Dict[str, Any], Future]]" = queue.Queue()
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def consultar(self, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        """Encola la consulta y bloquea hasta que el lote que la contiene se resuelve."""
+        self._arrancar()
+        futuro: Future = Future()
+        self._cola.put(({k: v for k, v in parametros.items() if k != "agrupar"}, futuro))
+        return futuro.result(timeout=AZURE_MGMT_TIMEOUT * 3)
+
+    def _arrancar(self) -> None:
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="arm-agrupador", daemon=True)
+                self._hilo.start()
+
+    def _bucle(self) -> None:
+        while True:
+            pendientes = [self._cola.get()]
+            limite = time.monotonic() + BATCH_MAX_WAIT_MS / 1000
+            while len(pendientes) < BATCH_MAX_SIZE:
+                restante = limite - time.monotonic()
+                if restante <= 0: break
+                try: pendientes.append(self._cola.get(timeout=restante))
+                except queue.Empty: break
+            self._despachar(pendientes)
+
+    def _despachar(self, pendientes: List[Tuple[Dict[str, Any], Future]]) -> None:
+        try:
+            resultado = obtener_estados_batch({"ejecuciones": [p for p, _ in pendientes]}, {})
+            for (_, futuro), item in zip(pendientes, resultado["value"]):
+                if "error" in item: futuro.set_exception(Exception(f"Error obteniendo estado de ejecución '{item['run_id']}': {item['error']}"))
+                else: futuro.set_result(item["estado"])
+        except Exception as e:
+            logger.warning("Fallo despachando lote agrupado de %s consultas de estado: %s", len(pendientes), e)
+            for _, futuro in pendientes:
+                if not futuro.done(): futuro.set_exception(e)
+
+_agrupador_estados = _AgrupadorEstados()
 
 # --- FIN DEL MÓDULO actions/power_automate.py ---
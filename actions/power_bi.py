@@ -1,169 +1,848 @@
-# actions/power_automate.py (Refactorizado v3 - Corrección Final)
+# actions/power_bi.py (Refactorizado v3)
 
+import atexit
 import logging
 import os
-import requests # Para ejecutar_flow y tipos de excepción
+import re
+import threading
+import time
+import requests # Tipos de excepción
 import json
-from typing import Dict, List, Optional, Union, Any
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
+from urllib.parse import quote, urlencode, urlsplit
+from urllib3.util.retry import Retry
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple, Any
 
-# Importar Credential de Azure Identity para autenticación con Azure Management API
-# CORRECCIÓN: Eliminar try...except aquí. Si no se puede importar, debe fallar.
-from azure.identity import ClientSecretCredential, CredentialUnavailableError
+# Importar Credential de Azure Identity para autenticación con la API REST de Power BI
+from azure.identity import ClientSecretCredential, CredentialUnavailableError, TokenCachePersistenceOptions
 
 # Importar helper HTTP y constantes
 try:
-    from ..shared.helpers.http_client import hacer_llamada_api
+    from ..shared.helpers.http_client import hacer_llamada_api, crear_sesion_http, leer_json, segundos_retry_after, OPCIONES_SOCKET_KEEPALIVE
     from ..shared.constants import GRAPH_API_TIMEOUT # Timeout base
 except ImportError as e:
-    logging.critical(f"Error CRÍTICO importando helpers/constantes en Power Automate: {e}. Verifica la estructura y PYTHONPATH.", exc_info=True)
-    GRAPH_API_TIMEOUT = 45 # Default si falla import
+    logging.critical("Error CRÍTICO importando helpers/constantes en Power BI: %s. Verifica la estructura y PYTHONPATH.", e, exc_info=True)
     raise ImportError("No se pudo importar 'hacer_llamada_api' desde helpers.") from e
 
 # Usar el logger estándar de Azure Functions
 logger = logging.getLogger("azure.functions")
 
-# --- Constantes y Variables de Entorno Específicas para Azure Management ---
-try:
-    AZURE_SUBSCRIPTION_ID = os.environ['AZURE_SUBSCRIPTION_ID']
-    AZURE_RESOURCE_GROUP = os.environ['AZURE_RESOURCE_GROUP']
-    AZURE_LOCATION = os.environ.get('AZURE_LOCATION')
-    AZURE_CLIENT_ID = os.environ['AZURE_CLIENT_ID_MGMT']
-    AZURE_TENANT_ID = os.environ['AZURE_TENANT_ID']
-    AZURE_CLIENT_SECRET = os.environ['AZURE_CLIENT_SECRET_MGMT']
-except KeyError as e:
-    logger.critical(f"Error Crítico: Falta variable de entorno esencial para Power Automate Management: {e}")
-    raise ValueError(f"Configuración incompleta para Power Automate Management: falta {e}")
-
-AZURE_MGMT_BASE_URL = "https://management.azure.com"
-AZURE_MGMT_SCOPE = "https://management.azure.com/.default"
-LOGIC_API_VERSION = "2019-05-01"
-AZURE_MGMT_TIMEOUT = max(GRAPH_API_TIMEOUT, 60)
+# --- Constantes y Variables de Entorno Específicas para Power BI ---
+# Se leen y validan al crear la credencial (primer token), no al importar: si Power BI no está
+# configurado, el resto de acciones de la Function App se registran igual y solo fallan las pbi_*.
+_ENV_PBI = {"client_id": "AZURE_CLIENT_ID_PBI", "tenant_id": "AZURE_TENANT_ID", "client_secret": "AZURE_CLIENT_SECRET_PBI"}
+_config_pbi: Optional[Dict[str, str]] = None
+
+def _config_credencial_pbi() -> Dict[str, str]:
+    """Devuelve la configuración de la credencial PBI del entorno, validada una sola vez."""
+    global _config_pbi
+    if _config_pbi is None:
+        faltantes = [var for var in _ENV_PBI.values() if var not in os.environ]
+        if faltantes:
+            logger.critical("Error Crítico: Faltan variables de entorno esenciales para Power BI: %s", faltantes)
+            raise ValueError(f"Configuración incompleta para Power BI: falta {', '.join(faltantes)}")
+        _config_pbi = {clave: os.environ[var] for clave, var in _ENV_PBI.items()}
+    return _config_pbi
+
+# Configurable para nubes soberanas (ej. https://api.powerbigov.us/v1.0/myorg) sin tocar código
+PBI_BASE_URL = os.environ.get("PBI_BASE_URL", "https://api.powerbi.com/v1.0/myorg").rstrip("/")
+_GROUPS_URL = f"{PBI_BASE_URL}/groups" # Prefijo común de workspaces, precalculado al cargar el módulo
+_PBI_ORIGEN = "{0.scheme}://{0.netloc}/".format(urlsplit(PBI_BASE_URL)) # Los '@odata.nextLink' solo se siguen dentro de este origen
+_ADMIN_GROUPS_URL = f"{PBI_BASE_URL}/admin/groups" # API de administración (requiere permiso Tenant.Read.All)
+PBI_SCOPE = os.environ.get("PBI_SCOPE", "https://analysis.windows.net/powerbi/api/.default") # La nube soberana usa su propio recurso AAD
+PBI_TIMEOUT = max(GRAPH_API_TIMEOUT, 60)
+
+# --- Plantillas de URL PBI (se rellenan con _url_pbi, que escapa cada segmento) ---
+_URL_DASHBOARDS = _GROUPS_URL + "/{workspace_id}/dashboards"
+_URL_DASHBOARD = _URL_DASHBOARDS + "/{dashboard_id}"
+_URL_REPORTS = _GROUPS_URL + "/{workspace_id}/reports"
+_URL_REPORT = _URL_REPORTS + "/{report_id}"
+_URL_DATASETS = _GROUPS_URL + "/{workspace_id}/datasets"
+_URL_DATASET = _URL_DATASETS + "/{dataset_id}"
+_URL_REFRESHES = _URL_DATASET + "/refreshes"
+# Queries fijas ya codificadas en la plantilla (la consulta del último refresco es la que más se repite al sondear)
+_URL_ULTIMO_REFRESCO = _URL_REFRESHES + "?$top=1"
+_URL_WORKSPACE = _GROUPS_URL + "?$filter=id%20eq%20%27{workspace_id}%27" # workspace_id ya validado como GUID
+
+@lru_cache(maxsize=1024)
+def _url_pbi(plantilla: str, **partes: str) -> str:
+    """Rellena una plantilla de URL PBI escapando cada segmento (un id con '/' o '?' no altera la ruta).
+
+    Memoizada: al sondear refrescos se pide una y otra vez la misma URL para el mismo workspace/dataset.
+    """
+    return plantilla.format_map({k: quote(v, safe='') for k, v in partes.items()})
+
+@lru_cache(maxsize=128)
+def _url_con_query(url: str, query: Tuple[Tuple[str, str], ...]) -> str:
+    """Añade la query a la URL, codificada una sola vez por combinación (url, parámetros)."""
+    return f"{url}?{urlencode(query, quote_via=quote, safe='$,')}" if query else url
+
+# Caché de tokens persistente en disco (MSAL): el primer token tras un reinicio del worker se
+# obtiene con el refresh token guardado en vez de un intercambio OAuth completo. Opt-in porque
+# en Linux sin llavero (libsecret) solo funciona guardando el caché sin cifrar.
+PBI_TOKEN_CACHE_NOMBRE = os.environ.get('PBI_TOKEN_CACHE_NOMBRE') # ej. 'elitedynamics_pbi'; vacío = solo memoria
+PBI_TOKEN_CACHE_SIN_CIFRAR = os.environ.get('PBI_TOKEN_CACHE_SIN_CIFRAR', '').lower() in ('1', 'true', 'si', 'sí')
+
+# Pool de hilos para consultas PBI en paralelo: el trabajo es I/O de red, los hilos liberan
+# el GIL mientras esperan y el handler síncrono de Functions no tiene bucle de eventos.
+_PBI_MAX_WORKERS = 8
+_PBI_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_executor_lock_pbi = threading.Lock()
+
+def _executor_pbi() -> ThreadPoolExecutor:
+    """Pool de hilos para los fan-out de Power BI; se crea con el primer envío, no al importar el módulo."""
+    global _PBI_EXECUTOR
+    if _PBI_EXECUTOR is None:
+        with _executor_lock_pbi:
+            if _PBI_EXECUTOR is None: _PBI_EXECUTOR = ThreadPoolExecutor(max_workers=_PBI_MAX_WORKERS, thread_name_prefix="pbi")
+    return _PBI_EXECUTOR
+
+# --- Sesión HTTP compartida para Power BI ---
+# Pool keep-alive contra la API de Power BI (un handshake TLS por conexión, no por llamada).
+# Reintenta 429/5xx respetando 'Retry-After'; solo métodos idempotentes: el POST de
+# refrescar_dataset no se reintenta (un 429 ahí significa cuota de refrescos agotada).
+_PBI_RETRY = Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504), respect_retry_after_header=True, raise_on_status=False)
+# pool_block=True: en ráfagas (lotes, fan-out por workspace) se espera una conexión keep-alive
+# libre en lugar de abrir sockets extra; el keepalive TCP evita reutilizar conexiones que el
+# SNAT de Azure ya cerró por inactividad.
+_PBI_SESSION = crear_sesion_http(pool_connections=10, pool_maxsize=_PBI_MAX_WORKERS * 2, max_retries=_PBI_RETRY, pool_block=True,
+                                 socket_options=OPCIONES_SOCKET_KEEPALIVE)
+atexit.register(_PBI_SESSION.close)
 
 # --- Helper de Autenticación (Específico para este módulo) ---
-_credential_pa: Optional[ClientSecretCredential] = None
-_cached_mgmt_token_pa: Optional[str] = None
+_credential_pbi: Optional[ClientSecretCredential] = None
+_cached_pbi_token: Optional[str] = None
+_expira_pbi_token: float = 0.0 # Epoch (s) de expiración del token cacheado
+_MARGEN_RENOVACION_TOKEN_S = 300 # Renovar con 5 min de margen para no enviar un token a punto de caducar
+_token_lock_pbi = threading.Lock()
+# Renovación proactiva: un Timer pide el token nuevo antes de que el camino rápido lo rechace, así
+# ninguna invocación espera el round-trip a AAD mientras el host siga activo. Se adelanta al margen
+# del camino rápido y fuerza un token nuevo: a esa altura azure-identity aún devolvería el cacheado.
+_ANTELACION_RENOVACION_S = _MARGEN_RENOVACION_TOKEN_S + 60
+_timer_renovacion_pbi: Optional[threading.Timer] = None
+# Cabeceras PBI construidas una sola vez por token, junto con él (solo lectura, compartidas entre llamadas)
+_cached_pbi_headers: Optional[Mapping[str, str]] = None
+
+def _get_pbi_token() -> str:
+    """Obtiene un token de acceso (client credentials) para la API REST de Power BI (cacheado hasta poco antes de expirar)."""
+    # Camino rápido sin lock: el token se escribe antes que su expiración
+    expira, token = _expira_pbi_token, _cached_pbi_token
+    if token and expira - time.time() > _MARGEN_RENOVACION_TOKEN_S: return token
 
-def _get_azure_mgmt_token() -> str:
-    """Obtiene un token de acceso para Azure Management API."""
-    global _credential_pa, _cached_mgmt_token_pa
+    # El lock evita que varias invocaciones concurrentes pidan token a AAD a la vez
+    with _token_lock_pbi:
+        if _cached_pbi_token and _expira_pbi_token - time.time() > _MARGEN_RENOVACION_TOKEN_S: return _cached_pbi_token # Otro hilo ya renovó
+        return _solicitar_token_pbi()
 
-    # Verificar si azure-identity se importó correctamente (ya no es necesario el mock check)
-    # if ClientSecretCredential is None:
-    #     raise ImportError("Módulo azure.identity no disponible.")
+def _solicitar_token_pbi(forzar: bool = False) -> str:
+    """
+    Pide un token a AAD, lo cachea y programa su renovación. Requiere tener '_token_lock_pbi'.
 
-    if _cached_mgmt_token_pa: return _cached_mgmt_token_pa
+    ClientSecretCredential devuelve su token cacheado hasta ~5 min antes de caducar: con 'forzar' se
+    crea una credencial nueva (sin la caché persistente, que devolvería el mismo) para obtener otro.
+    """
+    global _credential_pbi, _cached_pbi_token, _cached_pbi_headers, _expira_pbi_token
 
-    if not _credential_pa:
-        logger.info("Creando credencial ClientSecretCredential para Azure Management (PA).")
+    if forzar or not _credential_pbi:
+        logger.info("Creando credencial ClientSecretCredential para Power BI.")
+        config = _config_credencial_pbi() # Fuera del try: su ValueError de configuración se propaga tal cual
         try:
-            _credential_pa = ClientSecretCredential(tenant_id=AZURE_TENANT_ID, client_id=AZURE_CLIENT_ID, client_secret=AZURE_CLIENT_SECRET)
+            opciones_credencial: Dict[str, Any] = {}
+            if PBI_TOKEN_CACHE_NOMBRE and not forzar:
+                opciones_credencial["cache_persistence_options"] = TokenCachePersistenceOptions(name=PBI_TOKEN_CACHE_NOMBRE, allow_unencrypted_storage=PBI_TOKEN_CACHE_SIN_CIFRAR)
+            _credential_pbi = ClientSecretCredential(tenant_id=config["tenant_id"], client_id=config["client_id"], client_secret=config["client_secret"], **opciones_credencial)
         except Exception as cred_err:
-             logger.critical(f"Error al crear ClientSecretCredential (PA): {cred_err}", exc_info=True)
-             raise Exception(f"Error configurando credencial Azure (PA): {cred_err}") from cred_err
+             logger.critical("Error al crear ClientSecretCredential (PBI): %s", cred_err, exc_info=True)
+             raise Exception(f"Error configurando credencial Azure (PBI): {cred_err}") from cred_err
 
     try:
-        logger.info(f"Solicitando token para Azure Management con scope: {AZURE_MGMT_SCOPE}")
-        if _credential_pa is None: raise Exception("Credencial PA no inicializada.")
-        token_info = _credential_pa.get_token(AZURE_MGMT_SCOPE)
-        _cached_mgmt_token_pa = token_info.token
-        logger.info("Token para Azure Management (PA) obtenido.")
-        return _cached_mgmt_token_pa
+        logger.info("Solicitando token para Power BI con scope: %s", PBI_SCOPE)
+        if _credential_pbi is None: raise Exception("Credencial PBI no inicializada.")
+        token_info = _credential_pbi.get_token(PBI_SCOPE)
+        # Orden de escritura token -> cabeceras -> expiración: los caminos rápidos leen primero la expiración
+        _cached_pbi_token = token_info.token
+        _cached_pbi_headers = MappingProxyType({'Authorization': f'Bearer {_cached_pbi_token}', 'Content-Type': 'application/json'})
+        _expira_pbi_token = float(token_info.expires_on)
+        logger.info("Token para Power BI obtenido.")
+        _programar_renovacion_pbi(_expira_pbi_token)
+        return _cached_pbi_token
     except CredentialUnavailableError as cred_err:
-         logger.critical(f"Credencial no disponible para obtener token ARM: {cred_err}", exc_info=True)
-         raise Exception(f"Credencial Azure (PA) no disponible: {cred_err}") from cred_err
+         logger.critical("Credencial no disponible para obtener token PBI: %s", cred_err, exc_info=True)
+         raise Exception(f"Credencial Azure (PBI) no disponible: {cred_err}") from cred_err
     except Exception as e:
-        logger.error(f"Error inesperado obteniendo token ARM (PA): {e}", exc_info=True)
-        raise Exception(f"Error obteniendo token Azure (PA): {e}") from e
+        logger.error("Error inesperado obteniendo token PBI: %s", e, exc_info=True)
+        raise Exception(f"Error obteniendo token Azure (PBI): {e}") from e
+
+def _programar_renovacion_pbi(expira: float) -> None:
+    """(Re)programa el Timer que renueva el token antes de que el camino rápido lo deje de aceptar."""
+    global _timer_renovacion_pbi
+    if _timer_renovacion_pbi is not None: _timer_renovacion_pbi.cancel()
+    _timer_renovacion_pbi = threading.Timer(max(60.0, expira - time.time() - _ANTELACION_RENOVACION_S), _renovar_token_en_segundo_plano)
+    _timer_renovacion_pbi.daemon = True # No bloquear el apagado del worker
+    _timer_renovacion_pbi.start()
 
-def _get_auth_headers_for_mgmt() -> Dict[str, str]:
-    """Construye las cabeceras de autenticación para ARM API."""
+def _renovar_token_en_segundo_plano() -> None:
+    """Callback del Timer: si falla, la siguiente llamada renueva de forma síncrona como antes."""
     try:
-        token = _get_azure_mgmt_token()
-        return {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        with _token_lock_pbi: _solicitar_token_pbi(forzar=True)
     except Exception as e:
-        raise Exception(f"No se pudieron obtener cabeceras auth para Management API: {e}") from e
-
-# ========================================================
-# ==== FUNCIONES DE ACCIÓN PARA POWER AUTOMATE (FLOWS) ====
-# ========================================================
-# (Funciones listar_flows, obtener_flow, crear_flow, actualizar_flow,
-#  eliminar_flow, ejecutar_flow sin cambios funcionales respecto a v2)
-
-def listar_flows(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    auth_headers = _get_auth_headers_for_mgmt(); sid = parametros.get('suscripcion_id', AZURE_SUBSCRIPTION_ID); rg = parametros.get('grupo_recurso', AZURE_RESOURCE_GROUP)
-    url = f"{AZURE_MGMT_BASE_URL}/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows?api-version={LOGIC_API_VERSION}"
-    logger.info(f"Listando flows en Sub '{sid}', RG '{rg}'"); return hacer_llamada_api("GET", url, auth_headers, timeout=AZURE_MGMT_TIMEOUT)
-
-def obtener_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    nombre_flow: Optional[str] = parametros.get("nombre_flow");
-    if not nombre_flow: raise ValueError("'nombre_flow' requerido.")
-    auth_headers = _get_auth_headers_for_mgmt(); sid = parametros.get('suscripcion_id', AZURE_SUBSCRIPTION_ID); rg = parametros.get('grupo_recurso', AZURE_RESOURCE_GROUP)
-    url = f"{AZURE_MGMT_BASE_URL}/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows/{nombre_flow}?api-version={LOGIC_API_VERSION}"
-    logger.info(f"Obteniendo flow '{nombre_flow}' en RG '{rg}'"); return hacer_llamada_api("GET", url, auth_headers, timeout=AZURE_MGMT_TIMEOUT)
-
-def crear_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    nombre_flow: Optional[str] = parametros.get("nombre_flow"); definicion_flow: Optional[Dict[str, Any]] = parametros.get("definicion_flow"); ubicacion: Optional[str] = parametros.get("ubicacion", AZURE_LOCATION)
-    if not nombre_flow: raise ValueError("'nombre_flow' requerido.");
-    if not definicion_flow or not isinstance(definicion_flow, dict): raise ValueError("'definicion_flow' (dict) requerido.")
-    if not ubicacion: raise ValueError("Se requiere 'ubicacion' o AZURE_LOCATION.")
-    auth_headers = _get_auth_headers_for_mgmt(); sid = parametros.get('suscripcion_id', AZURE_SUBSCRIPTION_ID); rg = parametros.get('grupo_recurso', AZURE_RESOURCE_GROUP)
-    url = f"{AZURE_MGMT_BASE_URL}/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows/{nombre_flow}?api-version={LOGIC_API_VERSION}"
-    body: Dict[str, Any] = {"location": ubicacion, "properties": {"definition": definicion_flow}}
-    logger.info(f"Creando flow '{nombre_flow}' en RG '{rg}', Loc '{ubicacion}'"); return hacer_llamada_api("PUT", url, auth_headers, json_data=body, timeout=AZURE_MGMT_TIMEOUT * 2)
-
-def actualizar_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    nombre_flow: Optional[str] = parametros.get("nombre_flow"); definicion_flow: Optional[Dict[str, Any]] = parametros.get("definicion_flow")
-    if not nombre_flow: raise ValueError("'nombre_flow' requerido.");
-    if not definicion_flow or not isinstance(definicion_flow, dict): raise ValueError("'definicion_flow' (dict) requerido.")
-    auth_headers = _get_auth_headers_for_mgmt(); sid = parametros.get('suscripcion_id', AZURE_SUBSCRIPTION_ID); rg = parametros.get('grupo_recurso', AZURE_RESOURCE_GROUP)
+        logger.warning("Renovación en segundo plano del token PBI fallida: %s", e)
+
+def _get_auth_headers_for_pbi() -> Mapping[str, str]:
+    """Devuelve las cabeceras de autenticación para la API REST de Power BI (las construidas con el token vigente)."""
+    # Camino rápido: una lectura de la expiración y otra de las cabeceras, sin llamadas intermedias
+    expira, cabeceras = _expira_pbi_token, _cached_pbi_headers
+    if cabeceras is not None and expira - time.time() > _MARGEN_RENOVACION_TOKEN_S: return cabeceras
     try:
-        params_get = {"nombre_flow": nombre_flow, "suscripcion_id": sid, "grupo_recurso": rg}; current_flow = obtener_flow(params_get, {})
-        current_location = current_flow.get("location");
-        if not current_location: raise ValueError("No se pudo obtener ubicación del flow existente.")
-    except Exception as get_err: raise Exception(f"No se pudo obtener flow actual '{nombre_flow}' para actualizar: {get_err}") from get_err
-    url = f"{AZURE_MGMT_BASE_URL}/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows/{nombre_flow}?api-version={LOGIC_API_VERSION}"
-    body: Dict[str, Any] = {"location": current_location, "properties": {"definition": definicion_flow}}
-    logger.info(f"Actualizando flow '{nombre_flow}' en RG '{rg}'"); return hacer_llamada_api("PUT", url, auth_headers, json_data=body, timeout=AZURE_MGMT_TIMEOUT * 2)
-
-def eliminar_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    nombre_flow: Optional[str] = parametros.get("nombre_flow");
-    if not nombre_flow: raise ValueError("'nombre_flow' requerido.")
-    auth_headers = _get_auth_headers_for_mgmt(); sid = parametros.get('suscripcion_id', AZURE_SUBSCRIPTION_ID); rg = parametros.get('grupo_recurso', AZURE_RESOURCE_GROUP)
-    url = f"{AZURE_MGMT_BASE_URL}/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows/{nombre_flow}?api-version={LOGIC_API_VERSION}"
-    logger.info(f"Eliminando flow '{nombre_flow}' de RG '{rg}'"); hacer_llamada_api("DELETE", url, auth_headers, timeout=AZURE_MGMT_TIMEOUT); return {"status": "Eliminado", "flow": nombre_flow}
-
-def ejecutar_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    flow_url: Optional[str] = parametros.get("flow_url"); payload: Optional[Dict[str, Any]] = parametros.get("payload")
-    if not flow_url: raise ValueError("'flow_url' requerido.")
-    request_headers = headers.copy();
-    if payload: request_headers['Content-Type'] = 'application/json'
-    logger.info(f"Ejecutando trigger de flow: POST {flow_url}")
+        _get_pbi_token()
+    except Exception as e:
+        raise Exception(f"No se pudieron obtener cabeceras auth para Power BI: {e}") from e
+    if _cached_pbi_headers is None: raise Exception("Cabeceras PBI no inicializadas.")
+    return _cached_pbi_headers
+
+def _renovar_auth_pbi(rechazadas: Mapping[str, str]) -> Mapping[str, str]:
+    """Si el token de las cabeceras 'rechazadas' (401) sigue cacheado, lo sustituye por uno nuevo de verdad; devuelve las cabeceras vigentes."""
+    with _token_lock_pbi:
+        if rechazadas.get("Authorization") == f"Bearer {_cached_pbi_token}": _solicitar_token_pbi(forzar=True) # Si otro hilo ya lo renovó tras el mismo 401, no pedir otro
+    return _get_auth_headers_for_pbi()
+
+# Los ids de workspace/dashboard/reporte/dataset son GUIDs: validarlos en cliente evita un
+# round-trip para ids mal formados y que un id manipulado altere la URL o el $filter.
+_GUID = r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+_UUID_RE = re.compile(rf"^{_GUID}$")
+
+def _validar_guid(nombre: str, valor: Any) -> None:
+    """ValueError si 'valor' no es un GUID."""
+    if not isinstance(valor, str) or not _UUID_RE.match(valor): raise ValueError(f"'{nombre}' no es un GUID válido: '{valor}'.")
+
+def _requeridos(parametros: Dict[str, Any], *nombres: str) -> Tuple[str, ...]:
+    """Extrae los parámetros requeridos en una pasada; ValueError listando todos los que falten. Los '*_id' deben ser GUIDs."""
+    valores = tuple(parametros.get(nombre) for nombre in nombres)
+    faltantes = [nombre for nombre, valor in zip(nombres, valores) if not valor]
+    if len(faltantes) == 1: raise ValueError(f"Parámetro '{faltantes[0]}' es requerido.")
+    if faltantes: raise ValueError(f"Parámetros requeridos: {', '.join(repr(f) for f in faltantes)}.")
+    for nombre, valor in zip(nombres, valores):
+        if nombre.endswith("_id"): _validar_guid(nombre, valor)
+    return valores # type: ignore[return-value]
+
+# --- Control de cuota (token bucket) ---
+# Power BI limita llamadas por usuario/tenant (≈120/min en la API general) y responde 429 con
+# 'Retry-After'. El cubo reparte el ritmo entre todos los hilos del worker y, tras un 429, pausa
+# todas las llamadas el tiempo indicado en vez de dejar que cada invocación reintente por su cuenta.
+_PBI_TASA_POR_S = 2.0
+_PBI_RAFAGA_MAX = 20
+_ESPERA_429_DEFECTO_S = 30.0 # Si falta 'Retry-After' o no se puede interpretar
+
+class _CuboTokensPBI:
+    """Token bucket thread-safe: 'tasa_por_s' llamadas sostenidas con ráfagas de hasta 'capacidad'."""
+
+    def __init__(self, tasa_por_s: float, capacidad: int) -> None:
+        self._tasa = tasa_por_s
+        self._capacidad = float(capacidad)
+        self._tokens = float(capacidad)
+        self._ultimo = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def adquirir(self) -> None:
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                if ahora >= self._pausa_hasta:
+                    self._tokens = min(self._capacidad, self._tokens + (ahora - self._ultimo) * self._tasa)
+                    self._ultimo = ahora
+                    if self._tokens >= 1: self._tokens -= 1; return
+                    espera = (1 - self._tokens) / self._tasa
+                else: espera = self._pausa_hasta - ahora
+            time.sleep(espera)
+
+    def pausar(self, segundos: float) -> None:
+        """Vacía el cubo y bloquea nuevas llamadas durante 'segundos' (429 con Retry-After)."""
+        with self._lock:
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + segundos)
+            self._tokens = 0.0; self._ultimo = self._pausa_hasta
+
+_cubo_pbi = _CuboTokensPBI(_PBI_TASA_POR_S, _PBI_RAFAGA_MAX)
+
+def _segundos_retry_after(response: requests.Response) -> float:
+    """Segundos indicados en 'Retry-After' (segundos o fecha HTTP; el valor por defecto si falta o no se entiende)."""
+    return segundos_retry_after(response, _ESPERA_429_DEFECTO_S)
+
+def _llamada_pbi(metodo: str, url: str, auth_headers: Mapping[str, str], pausar_cubo: bool = True, **kwargs: Any) -> Any:
+    """
+    hacer_llamada_api sobre la sesión PBI compartida, respetando el token bucket y renovando el token ante un 401.
+    Un 429 pausa el cubo de todo el worker salvo con 'pausar_cubo=False': para cuotas que no son de la API
+    entera (la de refrescos es por dataset) el 429 solo afecta a esa llamada.
+    """
+    kwargs.setdefault("timeout", PBI_TIMEOUT)
+    _cubo_pbi.adquirir()
+    try:
+        return hacer_llamada_api(metodo, url, auth_headers, session=_PBI_SESSION, renovar_auth=_renovar_auth_pbi, **kwargs)
+    except requests.exceptions.HTTPError as e:
+        if pausar_cubo and e.response is not None and e.response.status_code == 429:
+            espera = _segundos_retry_after(e.response)
+            logger.warning("Throttling (429) de Power BI en %s %s; pausando llamadas %ss", metodo, url, espera)
+            _cubo_pbi.pausar(espera)
+        raise
+
+# --- Caché TTL de lecturas ---
+# Workspaces, reportes, dashboards y datasets cambian en minutos u horas, no en segundos: los GET
+# de lectura se sirven desde memoria durante PBI_CACHE_TTL segundos (0 desactiva la caché). La
+# clave es la URL completa (la query ya va en ella). El estado de refresco no se cachea. Las acciones
+# de lectura aceptan 'sin_cache': True para forzar la lectura desde la API. Si la respuesta trajo
+# 'ETag', al caducar la entrada se revalida con 'If-None-Match': un 304 renueva el TTL sin cuerpo.
+# Con la caché llena se purgan las caducadas o, si no hay, la menos usada recientemente (LRU).
+PBI_CACHE_TTL_S = float(os.environ.get("PBI_CACHE_TTL", "60"))
+_PBI_CACHE_MAX = 512
+_cache_pbi: "OrderedDict[str, Tuple[float, Any, Optional[str]]]" = OrderedDict() # url -> (expira, resultado, etag); orden de uso
+_cache_lock_pbi = threading.Lock()
+# Single-flight: GET idénticos simultáneos (ej. varias invocaciones sobre el mismo dataset, o varios
+# sondeos del mismo refresco) comparten una sola petición en curso; los demás hilos esperan su Future.
+_en_vuelo_pbi: Dict[str, "Future[Any]"] = {}
+
+def _get_revalidando(url: str, auth_headers: Mapping[str, str], anterior: Optional[Tuple[float, Any, Optional[str]]]) -> Tuple[Any, Optional[str]]:
+    """GET que, si la entrada anterior tiene ETag, la revalida con 'If-None-Match'. Devuelve (resultado, etag)."""
+    etag = anterior[2] if anterior else None
+    if etag: auth_headers = {**auth_headers, "If-None-Match": etag}
+    response = _llamada_pbi("GET", url, auth_headers, expect_json=False)
+    if response is None: return None, None # 204 sin cuerpo
+    if response.status_code == 304 and anterior: return anterior[1], etag # Sin cambios: no se descarga ni decodifica el cuerpo
+    return (leer_json(response) if response.content else None), response.headers.get("ETag")
+
+def _get_fusionado(url: str, auth_headers: Mapping[str, str], anterior: Optional[Tuple[float, Any, Optional[str]]] = None) -> Tuple[Any, Optional[str]]:
+    """GET con peticiones idénticas concurrentes fusionadas (single-flight), cacheado o no. Devuelve (resultado, etag)."""
+    with _cache_lock_pbi:
+        futuro = _en_vuelo_pbi.get(url)
+        propio = futuro is None
+        if futuro is None: futuro = _en_vuelo_pbi[url] = Future()
+    if not propio: return futuro.result() # Otro hilo ya está pidiendo esta URL: esperar su respuesta
     try:
-        response = requests.post(flow_url, headers=request_headers, json=payload if payload else None, timeout=AZURE_MGMT_TIMEOUT)
-        response.raise_for_status(); logger.info(f"Trigger flow '{flow_url}' ejecutado. Status: {response.status_code}")
-        try: resp_data = response.json()
-        except json.JSONDecodeError: resp_data = response.text
-        return {"status": "Ejecutado" if response.ok else "Fallido", "status_code": response.status_code, "response_body": resp_data}
-    except requests.exceptions.RequestException as e: error_body = e.response.text[:200] if e.response else "N/A"; logger.error(f"Error Request ejecutando trigger flow '{flow_url}': {e}. Respuesta: {error_body}", exc_info=True); raise Exception(f"Error API ejecutando trigger flow: {e}") from e
-    except Exception as e: logger.error(f"Error inesperado ejecutando trigger flow '{flow_url}': {e}", exc_info=True); raise
-
-def obtener_estado_ejecucion_flow(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    """Obtiene el estado de una ejecución (run) específica de un flujo."""
-    nombre_flow: Optional[str] = parametros.get("nombre_flow")
-    run_id: Optional[str] = parametros.get("run_id")
-
-    # Corrección Flake8 E999: Separar los if/raise en líneas distintas
-    if not nombre_flow:
-        raise ValueError("'nombre_flow' es requerido.")
-    if not run_id:
-        raise ValueError("'run_id' es requerido.")
-
-    auth_headers = _get_auth_headers_for_mgmt()
-    sid = parametros.get('suscripcion_id', AZURE_SUBSCRIPTION_ID)
-    rg = parametros.get('grupo_recurso', AZURE_RESOURCE_GROUP)
-
-    url = f"{AZURE_MGMT_BASE_URL}/subscriptions/{sid}/resourceGroups/{rg}/providers/Microsoft.Logic/workflows/{nombre_flow}/runs/{run_id}?api-version={LOGIC_API_VERSION}"
-    logger.info(f"Obteniendo estado de ejecución '{run_id}' flow '{nombre_flow}'")
-    return hacer_llamada_api("GET", url, auth_headers, timeout=AZURE_MGMT_TIMEOUT)
-
-# --- FIN DEL MÓDULO actions/power_automate.py ---
+        respuesta = _get_revalidando(url, auth_headers, anterior)
+    except BaseException as e:
+        futuro.set_exception(e); raise
+    finally:
+        with _cache_lock_pbi: _en_vuelo_pbi.pop(url, None)
+    futuro.set_result(respuesta)
+    return respuesta
+
+def _leer_cacheado(url: str, auth_headers: Mapping[str, str], sin_cache: bool = False) -> Any:
+    """
+    GET de lectura con caché TTL por URL y peticiones idénticas concurrentes fusionadas. El resultado puede
+    ser compartido: no mutarlo. Con 'sin_cache' se ignora la entrada vigente (la respuesta nueva la reemplaza).
+    """
+    entrada = _cache_pbi.get(url) if PBI_CACHE_TTL_S > 0 else None
+    if entrada and not sin_cache and entrada[0] > time.monotonic():
+        with _cache_lock_pbi:
+            if url in _cache_pbi: _cache_pbi.move_to_end(url) # Acierto: pasa a la más recientemente usada
+        return entrada[1]
+    resultado, etag = _get_fusionado(url, auth_headers, entrada)
+    if PBI_CACHE_TTL_S > 0:
+        with _cache_lock_pbi:
+            ahora = time.monotonic()
+            if url not in _cache_pbi and len(_cache_pbi) >= _PBI_CACHE_MAX: # Purgar caducadas; si no hay, la menos usada
+                caducadas = [k for k, (expira, _, _) in _cache_pbi.items() if expira <= ahora]
+                for clave in caducadas: del _cache_pbi[clave]
+                if not caducadas: _cache_pbi.popitem(last=False)
+            _cache_pbi[url] = (ahora + PBI_CACHE_TTL_S, resultado, etag)
+            _cache_pbi.move_to_end(url)
+    return resultado
+
+def _invalidar_cache_pbi(prefijo: str) -> None:
+    """Descarta las entradas cacheadas cuya URL empieza por 'prefijo' (tras una escritura)."""
+    with _cache_lock_pbi:
+        for clave in [k for k in _cache_pbi if k.startswith(prefijo)]: del _cache_pbi[clave]
+
+def _validar_campos(campos: Any, nombre: str = "campos") -> Optional[List[str]]:
+    """Valida un parámetro opcional de proyección ('campos', 'select'): lista de nombres de campo."""
+    if campos is not None and (not isinstance(campos, list) or not all(isinstance(c, str) and c for c in campos)): raise ValueError(f"'{nombre}' debe ser una lista de nombres de campo.")
+    return campos
+
+def _entero(parametros: Dict[str, Any], nombre: str, defecto: int) -> int:
+    """Lee un parámetro entero opcional ('top', 'max_concurrencia'); ValueError claro si no es un entero."""
+    valor = parametros.get(nombre, defecto)
+    try: return int(valor)
+    except (TypeError, ValueError): raise ValueError(f"'{nombre}' debe ser un entero: '{valor}'.") from None
+
+_VERDADEROS = frozenset({"true", "1", "si", "sí", "yes"})
+_FALSOS = frozenset({"false", "0", "no", ""})
+
+def _booleano(parametros: Dict[str, Any], nombre: str) -> bool:
+    """Lee un parámetro booleano opcional ('sin_cache', 'todas_las_paginas', 'como_admin'); acepta bool o texto de query string ('true'/'false', '1'/'0', 'sí'/'no')."""
+    valor = parametros.get(nombre)
+    if valor is None or isinstance(valor, bool): return bool(valor)
+    texto = str(valor).strip().lower()
+    if texto in _VERDADEROS: return True
+    if texto in _FALSOS: return False
+    raise ValueError(f"'{nombre}' debe ser un booleano: '{valor}'.")
+
+def _proyectar_listado(respuesta: Any, campos: Optional[List[str]]) -> Any:
+    """Reduce cada elemento de 'value' a los 'campos' pedidos (la respuesta se devuelve tal cual si no hay campos)."""
+    if campos and isinstance(respuesta, dict): # Copia: 'respuesta' puede ser la entrada compartida de la caché
+        return {**respuesta, "value": [{campo: item.get(campo) for campo in campos} for item in respuesta.get("value", [])]}
+    return respuesta
+
+# =============================================
+# ==== FUNCIONES DE ACCIÓN PARA POWER BI ====
+# =============================================
+# Todas usan la firma (parametros: Dict[str, Any], headers: Dict[str, str]).
+# 'headers' (token Graph de la solicitud) no se usa: Power BI requiere su propio token.
+
+def listar_workspaces(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Lista los workspaces (grupos) de Power BI accesibles por la aplicación. Opcional: 'campos'."""
+    # GET /groups solo acepta $filter/$top/$skip: el contenido de cada workspace lo da listar_workspaces_con_contenido
+    if parametros.get("expand"): raise ValueError("'expand' no está soportado en /groups: usar pbi_listar_workspaces_con_contenido.")
+    campos = _validar_campos(parametros.get("campos"))
+    auth_headers = _get_auth_headers_for_pbi()
+    url = _GROUPS_URL
+    logger.info("Listando workspaces de Power BI")
+    return _proyectar_listado(_leer_cacheado(url, auth_headers, _booleano(parametros, "sin_cache")), campos)
+
+def _iterar_top_skip(url: str, query: Tuple[Tuple[str, str], ...], top: int) -> Iterator[Dict[str, Any]]:
+    """Genera los elementos de una colección paginada con $top/$skip (API admin, sin '@odata.nextLink'); en memoria solo la página en curso."""
+    saltar = 0
+    while True:
+        pagina = (_llamada_pbi("GET", _url_con_query(url, query + (("$top", str(top)), ("$skip", str(saltar)))), _get_auth_headers_for_pbi()) or {}).get("value", [])
+        yield from pagina
+        if len(pagina) < top: return
+        saltar += top
+
+# Contenido que la API admin trae embebido en cada workspace con una sola llamada ($expand) en lugar de N+1
+_EXPAND_CONTENIDO = "dashboards,reports,datasets"
+_ADMIN_TOP_MAX = 5000 # La API admin exige $top (máximo 5000)
+
+def listar_workspaces_con_contenido(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Lista los workspaces con sus dashboards, reportes y datasets. Pensado para inventarios: la respuesta
+    crece con todo el contenido del tenant. Con 'como_admin' usa /admin/groups con $expand (todo en una
+    sola llamada; 'top' opcional, por defecto 5000; con 'todas_las_paginas' se recorren con $skip más allá
+    de 5000). Sin 'como_admin' (GET /groups no admite $expand) lista los workspaces y reparte la lectura
+    de sus colecciones en paralelo; un fallo se reporta en 'errores' del workspace.
+    """
+    if not _booleano(parametros, "como_admin"):
+        workspaces = (listar_workspaces({"sin_cache": _booleano(parametros, "sin_cache")}, headers) or {}).get("value", [])
+        logger.info("Listando contenido de %s workspaces Power BI en paralelo", len(workspaces))
+        contenido = _contenido_workspaces([w["id"] for w in workspaces], list(_CONTENIDO_WORKSPACE), headers)
+        return {"value": [{**w, **contenido[w["id"]]} for w in workspaces]}
+    top = max(1, min(_entero(parametros, "top", _ADMIN_TOP_MAX), _ADMIN_TOP_MAX))
+    if _booleano(parametros, "todas_las_paginas"):
+        logger.info("Listando todos los workspaces Power BI (admin) con contenido, %s por página", top)
+        return {"value": list(_iterar_top_skip(_ADMIN_GROUPS_URL, (("$expand", _EXPAND_CONTENIDO),), top))}
+    url = _url_con_query(_ADMIN_GROUPS_URL, (("$expand", _EXPAND_CONTENIDO), ("$top", str(top))))
+    auth_headers = _get_auth_headers_for_pbi()
+    logger.info("Listando workspaces Power BI (admin) con contenido")
+    return _leer_cacheado(url, auth_headers, _booleano(parametros, "sin_cache"))
+
+def obtener_workspace(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Obtiene un workspace por ID (la API no expone GET /groups/{id}; se filtra la colección)."""
+    (workspace_id,) = _requeridos(parametros, "workspace_id")
+    auth_headers = _get_auth_headers_for_pbi()
+    url = _url_pbi(_URL_WORKSPACE, workspace_id=workspace_id)
+    logger.info("Obteniendo workspace Power BI: %s", workspace_id)
+    respuesta = _leer_cacheado(url, auth_headers, _booleano(parametros, "sin_cache"))
+    workspaces = respuesta.get("value", []) if respuesta else []
+    if not workspaces: raise ValueError(f"Workspace '{workspace_id}' no encontrado o sin acceso.")
+    return workspaces[0]
+
+# Lecturas por workspace con la misma forma (GET cacheado sobre una plantilla): recurso -> (plantilla, parámetros requeridos)
+_RECURSOS_PBI: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "dashboards": (_URL_DASHBOARDS, ("workspace_id",)),
+    "dashboard": (_URL_DASHBOARD, ("workspace_id", "dashboard_id")),
+    "reports": (_URL_REPORTS, ("workspace_id",)),
+    "report": (_URL_REPORT, ("workspace_id", "report_id")),
+    "datasets": (_URL_DATASETS, ("workspace_id",)),
+    "dataset": (_URL_DATASET, ("workspace_id", "dataset_id")),
+}
+
+def _url_recurso(recurso: str, parametros: Dict[str, Any], select: Optional[List[str]] = None) -> Tuple[str, Dict[str, str]]:
+    """Valida los parámetros del recurso y rellena su plantilla; el 'select' fijo de la acción (o, si no hay, el parámetro 'select') va como $select."""
+    plantilla, nombres = _RECURSOS_PBI[recurso]
+    partes = dict(zip(nombres, _requeridos(parametros, *nombres)))
+    select = select or _validar_campos(parametros.get("select"), "select")
+    url = _url_pbi(plantilla, **partes)
+    return (_url_con_query(url, (("$select", ",".join(select)),)) if select else url), partes
+
+def _leer_recurso(recurso: str, parametros: Dict[str, Any], select: Optional[List[str]] = None) -> Any:
+    """Lee un recurso de la tabla '_RECURSOS_PBI' (con caché; la URL incluye el $select, así que es parte de la clave)."""
+    url, partes = _url_recurso(recurso, parametros, select)
+    logger.info("Leyendo %s Power BI: %s", recurso, partes)
+    return _leer_cacheado(url, _get_auth_headers_for_pbi(), _booleano(parametros, "sin_cache"))
+
+def _iterar_paginas(url: str) -> Iterator[Dict[str, Any]]:
+    """Genera los elementos de un listado página a página siguiendo '@odata.nextLink' (en memoria solo la página en curso)."""
+    siguiente: Optional[str] = url
+    while siguiente:
+        pagina = _llamada_pbi("GET", siguiente, _get_auth_headers_for_pbi()) or {} # Cabeceras por página: listados largos sobreviven a la renovación del token
+        yield from pagina.get("value", [])
+        siguiente = pagina.get("@odata.nextLink")
+        if siguiente and not siguiente.startswith(_PBI_ORIGEN): raise ValueError(f"'@odata.nextLink' fuera de la API de Power BI: '{siguiente}'.")
+
+def iterar_recurso(recurso: str, parametros: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Genera los elementos de un listado por workspace ('dashboards', 'reports', 'datasets') recorriendo todas sus páginas."""
+    url, partes = _url_recurso(recurso, parametros); campos = _validar_campos(parametros.get("campos"))
+    logger.info("Iterando %s Power BI: %s", recurso, partes)
+    for item in _iterar_paginas(url): yield {campo: item.get(campo) for campo in campos} if campos else item
+
+def _listar_recurso(recurso: str, parametros: Dict[str, Any]) -> Dict[str, Any]:
+    """Listado por workspace: primera página (cacheada) o, con 'todas_las_paginas', todas siguiendo '@odata.nextLink'."""
+    if _booleano(parametros, "todas_las_paginas"): return {"value": list(iterar_recurso(recurso, parametros))}
+    campos = _validar_campos(parametros.get("campos"))
+    return _proyectar_listado(_leer_recurso(recurso, parametros), campos)
+
+def listar_dashboards(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Lista los dashboards de un workspace. Opcionales: 'select' ($select en el servidor), 'campos' (proyección de cada elemento), 'todas_las_paginas'."""
+    return _listar_recurso("dashboards", parametros)
+
+def obtener_dashboard(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Obtiene un dashboard específico de un workspace."""
+    return _leer_recurso("dashboard", parametros)
+
+def listar_reports(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Lista los reportes de un workspace. Opcionales: 'select' ($select en el servidor), 'campos' (proyección de cada elemento), 'todas_las_paginas'."""
+    return _listar_recurso("reports", parametros)
+
+def obtener_reporte(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Obtiene un reporte específico de un workspace."""
+    return _leer_recurso("report", parametros)
+
+def listar_datasets(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Lista los datasets de un workspace. Opcionales: 'select' ($select en el servidor), 'campos' (proyección de cada elemento), 'todas_las_paginas'."""
+    return _listar_recurso("datasets", parametros)
+
+def obtener_dataset(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Obtiene un dataset específico de un workspace."""
+    return _leer_recurso("dataset", parametros)
+
+def refrescar_dataset(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Inicia el refresco de un dataset. Power BI responde 202 Accepted con el 'RequestId' en cabeceras."""
+    workspace_id, dataset_id = _requeridos(parametros, "workspace_id", "dataset_id")
+    notify_option: Optional[str] = parametros.get("notify_option") # 'MailOnFailure', 'MailOnCompletion', 'NoNotification'
+    auth_headers = _get_auth_headers_for_pbi()
+    url = _url_pbi(_URL_REFRESHES, workspace_id=workspace_id, dataset_id=dataset_id)
+    body: Optional[Dict[str, Any]] = {"notifyOption": notify_option} if notify_option else None
+    logger.info("Iniciando refresco de dataset Power BI: %s en workspace %s", dataset_id, workspace_id)
+    try:
+        # expect_json=False: el 202 no trae cuerpo y el 'RequestId' viene en cabeceras
+        # pausar_cubo=False: el 429 aquí es la cuota de refrescos de este dataset, no throttling de la API
+        response = _llamada_pbi("POST", url, auth_headers, pausar_cubo=False, json_data=body, expect_json=False)
+    except requests.exceptions.HTTPError as e:
+        if e.response is None: raise
+        if e.response.status_code == 429: # Cuota de refrescos del dataset agotada: el resto de llamadas PBI siguen
+            espera = _segundos_retry_after(e.response)
+            logger.error("Límite de refrescos alcanzado (429) para dataset '%s'. Retry-After: %ss", dataset_id, espera)
+            return {"status": "Fallido", "status_code": 429, "retry_after_s": espera, "error": "Límite de refrescos alcanzado"}
+        try: error_body = leer_json(e.response)
+        except json.JSONDecodeError: error_body = e.response.text # orjson.JSONDecodeError también deriva de json.JSONDecodeError
+        return {"status": "Fallido", "status_code": e.response.status_code, "error": error_body}
+    _invalidar_cache_pbi(_url_pbi(_URL_DATASETS, workspace_id=workspace_id)) # El listado y el dataset reflejarán el refresco
+    request_id = response.headers.get('RequestId')
+    logger.info("Refresco de dataset '%s' aceptado. RequestId: %s", dataset_id, request_id)
+    return {"status": "Refresco iniciado", "dataset_id": dataset_id, "request_id": request_id}
+
+def refrescar_dataset_en_segundo_plano(parametros: Dict[str, Any], headers: Dict[str, str]) -> "Future[Dict[str, Any]]":
+    """
+    Variante no bloqueante de refrescar_dataset para orquestadores Python: envía el POST al executor
+    compartido y devuelve un Future (recoger con as_completed). No es una acción del mapping: un Future
+    no es serializable. No esperar el Future desde un hilo de _PBI_EXECUTOR.
+    """
+    _requeridos(parametros, "workspace_id", "dataset_id") # Los errores de validación saltan aquí, no en el Future
+    return _executor_pbi().submit(refrescar_dataset, dict(parametros), headers)
+
+def obtener_estado_refresco_dataset(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Obtiene el historial de refrescos de un dataset (por defecto solo el último)."""
+    workspace_id, dataset_id = _requeridos(parametros, "workspace_id", "dataset_id")
+    top = _entero(parametros, "top", 1)
+    auth_headers = _get_auth_headers_for_pbi()
+    if top == 1: url = _url_pbi(_URL_ULTIMO_REFRESCO, workspace_id=workspace_id, dataset_id=dataset_id)
+    else: url = _url_con_query(_url_pbi(_URL_REFRESHES, workspace_id=workspace_id, dataset_id=dataset_id), (("$top", str(top)),) if top else ())
+    logger.info("Obteniendo estado de refresco del dataset Power BI: %s en workspace %s", dataset_id, workspace_id)
+    return _get_fusionado(url, auth_headers)[0] # Sin caché (el estado cambia), pero varios sondeos simultáneos comparten la llamada
+
+# Estados terminales de un refresco ('Unknown' = en curso o sin fecha de fin todavía)
+_ESTADOS_REFRESCO_FINALES = frozenset(["Completed", "Failed", "Disabled", "Cancelled"])
+_ESPERA_REFRESCO_MAX_S = 30 # Tope del backoff exponencial entre sondeos (1, 2, 4, ... 30 s)
+# La espera corre dentro de la invocación: por debajo del límite de ~230 s de los triggers HTTP
+# (y del functionTimeout de host.json) para poder devolver {'finalizado': False} antes de que el host la corte.
+_TIMEOUT_ESPERA_MAX_S = 200.0
+
+def _segundos(parametros: Dict[str, Any], nombre: str, defecto: float, maximo: float) -> float:
+    """Lee un parámetro opcional en segundos ('timeout_s'); ValueError claro si no es un número > 0. Se acota a 'maximo'."""
+    valor = parametros.get(nombre, defecto)
+    try: segundos = float(valor)
+    except (TypeError, ValueError): raise ValueError(f"'{nombre}' debe ser un número de segundos: '{valor}'.") from None
+    if not segundos > 0: raise ValueError(f"'{nombre}' debe ser mayor que 0: '{valor}'.")
+    return min(segundos, maximo)
+_TOP_REFRESCOS_POR_REQUEST = 5 # Con 'request_id' se miran los últimos N: otro refresco posterior no oculta el nuestro
+
+def esperar_refresco_dataset(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Espera a que termine el último refresco de un dataset (o el de 'request_id', si se indica) sondeando
+    con backoff exponencial. Con 'request_id' un refresco anterior ya terminado no se toma por el nuevo.
+
+    'timeout_s' (por defecto y como máximo 200) acota la espera. Devuelve {'finalizado': bool, 'refresco': registro}.
+    Un 429 se respeta durmiendo lo que indique 'Retry-After' antes del siguiente sondeo.
+    """
+    workspace_id, dataset_id = _requeridos(parametros, "workspace_id", "dataset_id")
+    limite = time.monotonic() + _segundos(parametros, "timeout_s", _TIMEOUT_ESPERA_MAX_S, _TIMEOUT_ESPERA_MAX_S)
+    request_id: Optional[str] = parametros.get("request_id")
+    consulta = {"workspace_id": workspace_id, "dataset_id": dataset_id, "top": _TOP_REFRESCOS_POR_REQUEST if request_id else 1}
+    logger.info("Esperando refresco del dataset Power BI: %s en workspace %s", dataset_id, workspace_id)
+    registro: Optional[Dict[str, Any]] = None
+    intento = 0
+    while True:
+        espera = float(min(_ESPERA_REFRESCO_MAX_S, 2 ** intento))
+        try:
+            refrescos = (obtener_estado_refresco_dataset(consulta, headers) or {}).get("value", [])
+            if request_id: registro = next((r for r in refrescos if r.get("requestId") == request_id), None)
+            else: registro = refrescos[0] if refrescos else None
+            if registro and registro.get("status") in _ESTADOS_REFRESCO_FINALES: return {"finalizado": True, "refresco": registro}
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code != 429: raise
+            espera = _segundos_retry_after(e.response) # _llamada_pbi ya pausó el cubo ese tiempo
+            logger.warning("Throttling (429) sondeando refresco de '%s'; reintento en %ss", dataset_id, espera)
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            logger.warning("Timeout esperando refresco del dataset '%s'", dataset_id)
+            return {"finalizado": False, "refresco": registro}
+        time.sleep(min(espera, restante))
+        intento += 1
+
+def refrescar_dataset_y_esperar(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Inicia el refresco de un dataset y espera a que ese mismo refresco (por su 'RequestId') termine.
+    Opcionales: 'notify_option', 'timeout_s'. Si Power BI rechaza el refresco, devuelve ese resultado sin sondear.
+    """
+    _segundos(parametros, "timeout_s", _TIMEOUT_ESPERA_MAX_S, _TIMEOUT_ESPERA_MAX_S) # Validar antes de lanzar el refresco
+    inicio = refrescar_dataset(parametros, headers)
+    if inicio.get("status") != "Refresco iniciado": return inicio
+    espera = esperar_refresco_dataset({**parametros, "request_id": inicio.get("request_id")}, headers)
+    return {**inicio, **espera}
+
+_SELECT_EMBED = ["id", "name", "embedUrl", "datasetId"]
+
+def obtener_embed_url(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Obtiene la URL de embebido (embedUrl) de un reporte."""
+    reporte = _leer_recurso("report", parametros, _SELECT_EMBED) # Solo viajan las columnas que se devuelven
+    return {"id": reporte.get("id"), "name": reporte.get("name"), "embedUrl": reporte.get("embedUrl"), "datasetId": reporte.get("datasetId")}
+
+_URL_GENERAR_TOKEN_REPORTE = _URL_REPORT + "/GenerateToken"
+_NIVELES_ACCESO_EMBED = frozenset(["View", "Edit", "Create"])
+
+def obtener_embed_info(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Obtiene la URL de embebido y un token de embebido (GenerateToken) de un reporte, pidiendo ambos en
+    paralelo: lo que una página necesita para embeber en un solo round-trip de reloj. Opcional:
+    'access_level' ('View' por defecto, 'Edit' o 'Create').
+    """
+    workspace_id, report_id = _requeridos(parametros, "workspace_id", "report_id")
+    nivel = parametros.get("access_level", "View")
+    if nivel not in _NIVELES_ACCESO_EMBED: raise ValueError(f"'access_level' debe ser uno de: {', '.join(sorted(_NIVELES_ACCESO_EMBED))}.")
+    url_token = _url_pbi(_URL_GENERAR_TOKEN_REPORTE, workspace_id=workspace_id, report_id=report_id)
+    auth_headers = _get_auth_headers_for_pbi()
+    logger.info("Obteniendo información de embebido del reporte Power BI: %s en workspace %s", report_id, workspace_id)
+    futuro_token = _executor_pbi().submit(_llamada_pbi, "POST", url_token, auth_headers, json_data={"accessLevel": nivel})
+    embed = obtener_embed_url(parametros, headers) # En este hilo mientras el token se genera en el executor
+    token = futuro_token.result() or {}
+    return {**embed, "embedToken": token.get("token"), "tokenId": token.get("tokenId"), "expiration": token.get("expiration")}
+
+# Colecciones por workspace que se pueden pedir en 'incluir' -> acción de listado
+_CONTENIDO_WORKSPACE: Dict[str, Callable[[Dict[str, Any], Dict[str, str]], Dict[str, Any]]] = {"dashboards": listar_dashboards, "reports": listar_reports, "datasets": listar_datasets}
+
+def _validar_incluir(incluir: Any) -> List[str]:
+    """Valida el parámetro opcional 'incluir' (por defecto todas las colecciones de _CONTENIDO_WORKSPACE)."""
+    if incluir is None: return list(_CONTENIDO_WORKSPACE)
+    if not isinstance(incluir, list) or not incluir or any(c not in _CONTENIDO_WORKSPACE for c in incluir):
+        raise ValueError(f"'incluir' debe ser una lista con valores de: {', '.join(_CONTENIDO_WORKSPACE)}.")
+    return list(dict.fromkeys(incluir))
+
+def _contenido_workspaces(workspace_ids: List[str], incluir: List[str], headers: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Lista las colecciones 'incluir' de cada workspace con una tarea por par (workspace, colección) en el
+    executor compartido, sin anidar repartos. Un fallo se reporta en 'errores' del workspace sin abortar el resto.
+    """
+    _get_pbi_token() # Obtener el token antes de repartir: evita que varios hilos lo pidan a la vez en frío
+    futuros = {(wid, clave): _executor_pbi().submit(_CONTENIDO_WORKSPACE[clave], {"workspace_id": wid}, headers) for wid in workspace_ids for clave in incluir}
+    resultados: Dict[str, Dict[str, Any]] = {wid: {} for wid in workspace_ids}
+    for (wid, clave), futuro in futuros.items():
+        try: resultados[wid][clave] = (futuro.result() or {}).get("value", [])
+        except Exception as e: logger.warning("Fallo obteniendo %s del workspace '%s': %s", clave, wid, e); resultados[wid].setdefault("errores", {})[clave] = str(e)
+    return resultados
+
+def obtener_contenido_workspace(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Obtiene en paralelo los dashboards, reportes y datasets de un workspace ('incluir' opcional para elegir colecciones).
+
+    Un fallo en una colección no aborta el resto: se reporta en 'errores' bajo su clave.
+    """
+    (workspace_id,) = _requeridos(parametros, "workspace_id")
+    incluir = _validar_incluir(parametros.get("incluir"))
+    logger.info("Obteniendo contenido del workspace Power BI %s en paralelo", workspace_id)
+    return {"workspace_id": workspace_id, **_contenido_workspaces([workspace_id], incluir, headers)[workspace_id]}
+
+def listar_contenido_workspaces(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Obtiene en paralelo el contenido de varios workspaces ('workspace_ids'; 'incluir' opcional). Para todo el
+    tenant en una sola llamada, ver listar_workspaces_con_contenido ($expand). Devuelve {'workspaces': {id: {...}}}.
+    """
+    workspace_ids: Optional[List[str]] = parametros.get("workspace_ids")
+    if not workspace_ids or not isinstance(workspace_ids, list): raise ValueError("Parámetro 'workspace_ids' (lista) es requerido.")
+    workspace_ids = list(dict.fromkeys(workspace_ids))
+    for wid in workspace_ids: _validar_guid("workspace_ids", wid)
+    incluir = _validar_incluir(parametros.get("incluir"))
+    logger.info("Obteniendo %s de %s workspaces Power BI en paralelo", incluir, len(workspace_ids))
+    return {"workspaces": _contenido_workspaces(workspace_ids, incluir, headers)}
+
+def _repartir_por_workspace(accion: Callable[[Dict[str, Any], Dict[str, str]], Dict[str, Any]], parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Ejecuta 'accion' (una acción de listado por workspace) en paralelo para cada id de 'workspace_ids'.
+
+    Devuelve {'workspaces': {workspace_id: [items] | {'error': ...}}}; un fallo no aborta el resto.
+    """
+    workspace_ids: Optional[List[str]] = parametros.get("workspace_ids")
+    if not workspace_ids or not isinstance(workspace_ids, list): raise ValueError("Parámetro 'workspace_ids' (lista) es requerido.")
+    workspace_ids = list(dict.fromkeys(workspace_ids)) # Sin duplicados, conservando el orden
+    for wid in workspace_ids: _validar_guid("workspace_ids", wid)
+    _get_pbi_token() # Token listo antes de repartir entre hilos
+    logger.info("Ejecutando %s en %s workspaces en paralelo", accion.__name__, len(workspace_ids))
+    comunes: Dict[str, Any] = {k: parametros[k] for k in ("campos", "todas_las_paginas") if k in parametros}
+    futuros = {wid: _executor_pbi().submit(accion, {**comunes, "workspace_id": wid}, headers) for wid in workspace_ids}
+    resultados: Dict[str, Any] = {}
+    for wid, futuro in futuros.items():
+        try: resultados[wid] = (futuro.result() or {}).get("value", [])
+        except Exception as e: logger.warning("Fallo en %s para workspace '%s': %s", accion.__name__, wid, e); resultados[wid] = {"error": str(e)}
+    return {"workspaces": resultados}
+
+def listar_datasets_multi(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Lista en paralelo los datasets de varios workspaces ('workspace_ids')."""
+    return _repartir_por_workspace(listar_datasets, parametros, headers)
+
+def listar_dashboards_multi(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Lista en paralelo los dashboards de varios workspaces ('workspace_ids')."""
+    return _repartir_por_workspace(listar_dashboards, parametros, headers)
+
+def listar_reports_multi(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Lista en paralelo los reportes de varios workspaces ('workspace_ids')."""
+    return _repartir_por_workspace(listar_reports, parametros, headers)
+
+def _repartir_por_dataset(accion: Callable[[Dict[str, Any], Dict[str, str]], Dict[str, Any]], parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Ejecuta 'accion' para cada id de 'dataset_ids' del workspace con a lo sumo 'max_concurrencia'
+    llamadas a la vez (el ritmo global lo sigue marcando el token bucket). Devuelve
+    {'value': {dataset_id: resultado | {'error': ...}}}; un fallo no aborta el resto.
+    """
+    (workspace_id,) = _requeridos(parametros, "workspace_id")
+    dataset_ids: Optional[List[str]] = parametros.get("dataset_ids")
+    if not dataset_ids or not isinstance(dataset_ids, list): raise ValueError("Parámetro 'dataset_ids' (lista) es requerido.")
+    dataset_ids = list(dict.fromkeys(dataset_ids))
+    for dataset_id in dataset_ids: _validar_guid("dataset_ids", dataset_id)
+    max_concurrencia = max(1, min(_entero(parametros, "max_concurrencia", _PBI_MAX_WORKERS), _PBI_MAX_WORKERS, len(dataset_ids)))
+    comunes: Dict[str, Any] = {k: parametros[k] for k in ("notify_option", "top") if k in parametros}
+
+    # 'max_concurrencia' trabajadores consumen una cola común de ids: no se ocupan hilos del executor esperando turno
+    pendientes = iter(dataset_ids); lock_pendientes = threading.Lock()
+    resultados: Dict[str, Any] = {}
+    def _trabajador() -> None:
+        while True:
+            with lock_pendientes: dataset_id = next(pendientes, None)
+            if dataset_id is None: return
+            try: resultados[dataset_id] = accion({**comunes, "workspace_id": workspace_id, "dataset_id": dataset_id}, headers)
+            except Exception as e: logger.warning("Fallo en %s para dataset '%s': %s", accion.__name__, dataset_id, e); resultados[dataset_id] = {"error": str(e)}
+
+    _get_pbi_token() # Token listo antes de repartir entre hilos
+    logger.info("Ejecutando %s en %s datasets del workspace %s (concurrencia %s)", accion.__name__, len(dataset_ids), workspace_id, max_concurrencia)
+    for futuro in [_executor_pbi().submit(_trabajador) for _ in range(max_concurrencia)]: futuro.result()
+    return {"value": {dataset_id: resultados[dataset_id] for dataset_id in dataset_ids}}
+
+def refrescar_datasets(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Inicia el refresco de varios datasets de un workspace ('dataset_ids'; opcionales 'notify_option', 'max_concurrencia')."""
+    return _repartir_por_dataset(refrescar_dataset, parametros, headers)
+
+def obtener_estados_refresco(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Obtiene el estado de refresco de varios datasets de un workspace ('dataset_ids'; opcionales 'top', 'max_concurrencia')."""
+    return _repartir_por_dataset(obtener_estado_refresco_dataset, parametros, headers)
+
+# tipo -> (acción de detalle, nombre de su parámetro id) para obtener_varios
+_DETALLE_POR_TIPO = {"dashboards": (obtener_dashboard, "dashboard_id"), "reports": (obtener_reporte, "report_id"), "datasets": (obtener_dataset, "dataset_id")}
+
+def obtener_varios(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Obtiene en paralelo varios elementos de un mismo workspace: 'tipo' ('dashboards', 'reports'
+    o 'datasets') e 'ids' (lista). Devuelve {'value': {id: elemento | {'error': ...}}}.
+    """
+    (workspace_id,) = _requeridos(parametros, "workspace_id")
+    tipo, ids = parametros.get("tipo"), parametros.get("ids")
+    if tipo not in _DETALLE_POR_TIPO: raise ValueError(f"'tipo' debe ser uno de {sorted(_DETALLE_POR_TIPO)}.")
+    if not ids or not isinstance(ids, list): raise ValueError("Parámetro 'ids' (lista) es requerido.")
+    accion, clave_id = _DETALLE_POR_TIPO[tipo]
+    ids = list(dict.fromkeys(ids))
+    for id_elemento in ids: _validar_guid(clave_id, id_elemento)
+    _get_pbi_token() # Token listo antes de repartir entre hilos
+    logger.info("Obteniendo %s %s del workspace Power BI %s en paralelo", len(ids), tipo, workspace_id)
+    futuros = {id_elemento: _executor_pbi().submit(accion, {"workspace_id": workspace_id, clave_id: id_elemento}, headers) for id_elemento in ids}
+    resultados: Dict[str, Any] = {}
+    for id_elemento, futuro in futuros.items():
+        try: resultados[id_elemento] = futuro.result()
+        except Exception as e: logger.warning("Fallo obteniendo %s '%s': %s", tipo, id_elemento, e); resultados[id_elemento] = {"error": str(e)}
+    return {"value": resultados}
+
+# Métodos admitidos en ejecutar_lote_pbi: lecturas y POST de consultas/refrescos. Sin DELETE/PATCH, y
+# POST solo a rutas de la lista: en Power BI un POST también crea workspaces, concede acceso, clona,
+# toma el control de datasets o llama a la API admin, y el lote corre con la identidad de la aplicación.
+_METODOS_LOTE_PBI = frozenset(["GET", "POST"])
+_RUTAS_POST_LOTE_PBI = re.compile(rf"^(?:/groups/{_GUID})?/datasets/{_GUID}/(?:executeQueries|refreshes)$")
+
+def _ejecutar_solicitud_lote(solicitud: Dict[str, Any], auth_headers: Mapping[str, str]) -> Any:
+    """Ejecuta una sub-solicitud de ejecutar_lote_pbi contra PBI_BASE_URL."""
+    # Un 429 de '/refreshes' es la cuota de refrescos de ese dataset: no pausar el resto de llamadas
+    pausar_cubo = not (solicitud["method"] == "POST" and solicitud["ruta"].endswith("/refreshes"))
+    return _llamada_pbi(solicitud["method"], f"{PBI_BASE_URL}{solicitud['ruta']}", auth_headers, pausar_cubo=pausar_cubo, json_data=solicitud.get("body"))
+
+def ejecutar_lote_pbi(parametros: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Ejecuta varias llamadas a la API REST de Power BI en paralelo y devuelve sus resultados en orden.
+
+    'solicitudes' es una lista de {'method': 'GET'|'POST', 'ruta': '/groups/...', 'body'?}; 'ruta' es
+    relativa a PBI_BASE_URL (el token PBI nunca se envía a otro host) e incluye la query si hace falta.
+    POST solo se admite a '.../datasets/{did}/executeQueries' (DAX) y '.../datasets/{did}/refreshes'.
+    Un fallo individual no aborta el resto: se reporta en la clave 'error' de su elemento.
+    """
+    solicitudes: Optional[List[Dict[str, Any]]] = parametros.get("solicitudes")
+    if not solicitudes or not isinstance(solicitudes, list) or not all(isinstance(x, dict) for x in solicitudes):
+        raise ValueError("Parámetro 'solicitudes' (lista de {'method', 'ruta'}) es requerido.")
+    solicitudes = [{**solicitud, "method": str(solicitud.get("method", "GET")).upper()} for solicitud in solicitudes]
+    for solicitud in solicitudes:
+        if solicitud["method"] not in _METODOS_LOTE_PBI: raise ValueError(f"Método no admitido en lote: '{solicitud['method']}'.")
+        ruta = solicitud.get("ruta")
+        if not isinstance(ruta, str) or not ruta.startswith("/"): raise ValueError(f"'ruta' debe ser relativa a la API de Power BI (empezar por '/'): '{ruta}'.")
+        if solicitud["method"] == "POST" and not _RUTAS_POST_LOTE_PBI.match(ruta): raise ValueError(f"POST no admitido en lote para la ruta: '{ruta}'.")
+        if "params" in solicitud: raise ValueError("'params' no se admite en lote: incluir la query en 'ruta'.")
+    # La API REST de Power BI no tiene endpoint $batch genérico: cada sub-solicitud va en paralelo sobre las conexiones keep-alive
+    auth_headers = _get_auth_headers_for_pbi()
+    logger.info("Ejecutando lote de %s solicitudes Power BI en paralelo", len(solicitudes))
+    futuros = [_executor_pbi().submit(_ejecutar_solicitud_lote, solicitud, auth_headers) for solicitud in solicitudes]
+    resultados: List[Dict[str, Any]] = []
+    for solicitud, futuro in zip(solicitudes, futuros):
+        item: Dict[str, Any] = {"method": solicitud["method"], "ruta": solicitud["ruta"]}
+        try: item["resultado"] = futuro.result()
+        except Exception as e: logger.warning("Fallo en sub-solicitud %s %s: %s", item['method'], item['ruta'], e); item["error"] = str(e)
+        resultados.append(item)
+    return {"value": resultados}
+
+# --- Precalentamiento (opt-in) ---
+# Con PBI_PRECALENTAR activo, al cargar el módulo (arranque del host) se pide el token y se deja la
+# lista de workspaces en la caché TTL en segundo plano: la primera invocación no paga AAD + /groups.
+PBI_PRECALENTAR = os.environ.get('PBI_PRECALENTAR', '').lower() in ('1', 'true', 'si', 'sí')
+
+def precalentar_pbi() -> None:
+    """Obtiene el token PBI y precarga listar_workspaces en la caché. Los fallos solo se registran."""
+    try:
+        _get_auth_headers_for_pbi()
+        listar_workspaces({}, {})
+        logger.info("Power BI precalentado (token y workspaces en caché)")
+    except Exception as e: logger.warning("No se pudo precalentar Power BI: %s", e)
+
+if PBI_PRECALENTAR: _executor_pbi().submit(precalentar_pbi) # Sin bloquear la importación ni el registro de acciones
+
+# --- FIN DEL MÓDULO actions/power_bi.py ---
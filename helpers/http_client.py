@@ -9,7 +9,13 @@ y timeouts configurables.
 import logging
 import requests
 import json
-from typing import Dict, Any, Optional, Union
+import socket
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+from typing import Callable, Dict, Any, List, Mapping, Optional, Tuple, Union
 
 # Asumiendo que constants.py está en el directorio 'shared' padre
 # Ajusta la ruta si tu estructura es diferente (ej. from ..constants import ...)
@@ -27,18 +33,97 @@ except ImportError:
         f"Verifica la estructura del proyecto y los imports relativos."
     )
 
+# orjson (opcional): serializa/deserializa en C y devuelve bytes directamente.
+# Útil con definiciones grandes (Logic Apps); si no está instalado se usa json de la stdlib.
+try:
+    import orjson
+except ImportError:
+    orjson = None # type: ignore[assignment]
+
 # Usar el logger estándar de Azure Functions para integración automática
 logger = logging.getLogger("azure.functions")
 
+def escribir_json(obj: Any) -> bytes:
+    """Serializa a bytes JSON UTF-8 (con orjson si está disponible; json de la stdlib si orjson lo rechaza)."""
+    if orjson is not None:
+        try: return orjson.dumps(obj)
+        except TypeError: pass # Claves no str, enteros de más de 64 bits...: json sí los serializa
+    return json.dumps(obj).encode("utf-8")
+
+def leer_json(response: requests.Response) -> Any:
+    """Decodifica el cuerpo JSON de una respuesta (con orjson si está disponible)."""
+    return orjson.loads(response.content) if orjson is not None else response.json()
+
+def segundos_retry_after(response: requests.Response, defecto: float) -> float:
+    """Segundos indicados en 'Retry-After' (entero o fecha HTTP, RFC 9110); 'defecto' si falta o no se puede interpretar."""
+    valor = response.headers.get("Retry-After", "").strip()
+    if valor.isdigit(): return float(valor)
+    try: fecha = parsedate_to_datetime(valor)
+    except (TypeError, ValueError, IndexError): return defecto
+    if fecha.tzinfo is None: fecha = fecha.replace(tzinfo=timezone.utc)
+    return max(0.0, (fecha - datetime.now(timezone.utc)).total_seconds())
+
+# Opciones de socket para pools de larga vida: TCP_NODELAY (default de urllib3) + keepalive TCP.
+# El balanceador/SNAT de Azure corta conexiones inactivas a los ~4 minutos; sondear antes
+# evita que el pool reutilice un socket ya muerto (reset + reconexión en la siguiente llamada).
+OPCIONES_SOCKET_KEEPALIVE: List[Tuple[int, int, int]] = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+if hasattr(socket, "TCP_KEEPIDLE"): # Linux (plan de Functions); no disponible en todas las plataformas
+    OPCIONES_SOCKET_KEEPALIVE += [(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 120), (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 30), (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 4)]
+
+class _AdaptadorHTTP(HTTPAdapter):
+    """HTTPAdapter que pasa 'socket_options' propias al PoolManager de urllib3."""
+
+    def __init__(self, *args: Any, socket_options: Optional[List[Tuple[int, int, int]]] = None, **kwargs: Any) -> None:
+        self._socket_options = socket_options # Antes de super(): HTTPAdapter.__init__ llama a init_poolmanager
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        if self._socket_options is not None:
+            kwargs["socket_options"] = self._socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+def crear_sesion_http(
+    pool_connections: int = 10,
+    pool_maxsize: int = 10,
+    max_retries: Optional[Retry] = None,
+    pool_block: bool = False,
+    socket_options: Optional[List[Tuple[int, int, int]]] = None
+) -> requests.Session:
+    """
+    Crea una requests.Session con un pool de conexiones keep-alive montado en 'https://' y 'http://'.
+
+    Reutilizar la sesión entre llamadas evita un handshake TCP+TLS por solicitud
+    contra el mismo host. La sesión es segura para uso concurrente desde varios hilos.
+
+    Args:
+        pool_connections (int, optional): Número de pools (hosts) a mantener. Defaults to 10.
+        pool_maxsize (int, optional): Conexiones máximas reutilizables por host. Defaults to 10.
+        max_retries (Optional[Retry], optional): Política de reintentos de urllib3. Defaults to None (sin reintentos).
+        pool_block (bool, optional): Si es True, al agotarse el pool se espera una conexión libre en lugar de
+                                     abrir una extra que luego se descarta. Defaults to False.
+        socket_options (Optional[List[Tuple[int, int, int]]], optional): Opciones de socket para las conexiones
+                                     del pool (ej. OPCIONES_SOCKET_KEEPALIVE). Defaults to None (las de urllib3).
+
+    Returns:
+        requests.Session: Sesión lista para pasar como 'session' a hacer_llamada_api.
+    """
+    sesion = requests.Session()
+    adaptador = _AdaptadorHTTP(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries if max_retries is not None else 0, pool_block=pool_block, socket_options=socket_options)
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    return sesion
+
 def hacer_llamada_api(
     metodo: str,
     url: str,
-    headers: Dict[str, str],
+    headers: Mapping[str, str],
     params: Optional[Dict[str, Any]] = None,
     json_data: Optional[Dict[str, Any]] = None,
     data: Optional[Union[bytes, str]] = None, # Permitir bytes o string para data
     timeout: int = GRAPH_API_TIMEOUT,
-    expect_json: bool = True
+    expect_json: bool = True,
+    session: Optional[requests.Session] = None,
+    renovar_auth: Optional[Callable[[Mapping[str, str]], Mapping[str, str]]] = None
 ) -> Any:
     """
     Realiza una llamada HTTP genérica usando la librería requests, con logging
@@ -47,13 +132,17 @@ def hacer_llamada_api(
     Args:
         metodo (str): Método HTTP (GET, POST, PUT, PATCH, DELETE).
         url (str): URL completa del endpoint. Debe ser la URL final (ej., incluyendo BASE_URL si aplica).
-        headers (Dict[str, str]): Cabeceras HTTP, DEBE incluir el token 'Authorization: Bearer ...'.
+        headers (Mapping[str, str]): Cabeceras HTTP, DEBE incluir el token 'Authorization: Bearer ...'.
         params (Optional[Dict[str, Any]], optional): Parámetros de query string. Defaults to None.
         json_data (Optional[Dict[str, Any]], optional): Payload para enviar como JSON. Ignorado si 'data' se proporciona. Defaults to None.
         data (Optional[Union[bytes, str]], optional): Payload para enviar como raw data (bytes o string). Defaults to None.
         timeout (int, optional): Timeout en segundos para la solicitud. Defaults to GRAPH_API_TIMEOUT.
         expect_json (bool, optional): Indica si se espera una respuesta JSON.
                                       Si es False, devuelve el objeto Response completo. Defaults to True.
+        session (Optional[requests.Session], optional): Sesión con pool de conexiones a reutilizar
+                                      (ver crear_sesion_http). Defaults to None (conexión nueva por llamada).
+        renovar_auth (Optional[Callable[[Mapping[str, str]], Mapping[str, str]]], optional): Si se indica y la API responde 401,
+                                      se invoca con las cabeceras rechazadas para obtener otras con un token nuevo y se reintenta una sola vez. Defaults to None.
 
     Returns:
         Any: El cuerpo de la respuesta JSON decodificado si expect_json es True y la respuesta no está vacía (2xx).
@@ -78,37 +167,57 @@ def hacer_llamada_api(
     metodo = metodo.upper()
 
     # --- Logging de la Solicitud ---
-    # Log detallado para depuración (nivel DEBUG)
-    logger.debug(f"Iniciando llamada API: {metodo} {url}")
-    # No loguear headers completos por seguridad (puede contener tokens), solo indicar su presencia.
-    logger.debug(f"Headers presentes: {list(headers.keys())}")
-    if params:
-        logger.debug(f"Query Params: {params}")
-    # Loguear payload con cuidado (puede contener info sensible)
-    if json_data and data is None:
-        # Loguear solo las claves o una versión truncada/sanitizada si es necesario
-        logger.debug(f"JSON Payload (claves): {list(json_data.keys())}")
-    elif data:
-        data_type = type(data).__name__
-        data_preview = str(data[:100]) + '...' if isinstance(data, (str, bytes)) and len(data) > 100 else str(data)
-        logger.debug(f"Raw Data Payload (tipo: {data_type}, preview: {data_preview})")
-    logger.debug(f"Timeout: {timeout}s, Expect JSON: {expect_json}")
+    # Log detallado para depuración (nivel DEBUG); se omite entero si DEBUG no está activo
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Iniciando llamada API: %s %s", metodo, url)
+        # No loguear headers completos por seguridad (puede contener tokens), solo indicar su presencia.
+        logger.debug("Headers presentes: %s", list(headers.keys()))
+        if params:
+            logger.debug("Query Params: %s", params)
+        # Loguear payload con cuidado (puede contener info sensible)
+        if json_data and data is None:
+            # Loguear solo las claves o una versión truncada/sanitizada si es necesario
+            logger.debug("JSON Payload (claves): %s", list(json_data.keys()))
+        elif data:
+            data_type = type(data).__name__
+            data_preview = str(data[:100]) + '...' if isinstance(data, (str, bytes)) and len(data) > 100 else str(data)
+            logger.debug("Raw Data Payload (tipo: %s, preview: %s)", data_type, data_preview)
+        logger.debug("Timeout: %ss, Expect JSON: %s", timeout, expect_json)
 
     # --- Ejecución de la Solicitud ---
     try:
-        response = requests.request(
-            method=metodo,
-            url=url,
-            headers=headers,
-            params=params,
-            # Enviar 'json' solo si 'json_data' tiene valor y 'data' no.
-            json=json_data if data is None and json_data is not None else None,
-            data=data,
-            timeout=timeout
-        )
+        # Con orjson, el payload JSON se serializa una sola vez a bytes y se envía como 'data'.
+        # orjson rechaza (TypeError) claves no str y tipos que json sí serializa: en ese caso el
+        # payload sigue en 'json_data' y requests lo serializa con json de la stdlib, como antes.
+        if orjson is not None and json_data is not None and data is None:
+            try:
+                data = orjson.dumps(json_data)
+                headers = {**headers, "Content-Type": "application/json"}
+                json_data = None
+            except TypeError:
+                logger.debug("orjson no pudo serializar el payload de %s %s; se usa json de la stdlib", metodo, url)
+
+        cliente = session if session is not None else requests
+        def _enviar(cabeceras: Mapping[str, str]) -> requests.Response:
+            return cliente.request(
+                method=metodo,
+                url=url,
+                headers=cabeceras,
+                params=params,
+                # Enviar 'json' solo si 'json_data' tiene valor y 'data' no.
+                json=json_data if data is None and json_data is not None else None,
+                data=data,
+                timeout=timeout
+            )
+        response = _enviar(headers)
+
+        # Token rechazado (rotado/revocado): renovar una vez y repetir sobre la misma sesión
+        if response.status_code == 401 and renovar_auth is not None:
+            logger.warning("401 en %s %s. Renovando token y reintentando una vez.", metodo, url)
+            response = _enviar({**headers, **renovar_auth(headers)})
 
         # Loguear status code y razón para todas las respuestas
-        logger.debug(f"Respuesta recibida: Status={response.status_code}, Reason='{response.reason}'")
+        logger.debug("Respuesta recibida: Status=%s, Reason='%s'", response.status_code, response.reason)
 
         # Lanzar excepción para respuestas 4xx (errores del cliente) y 5xx (errores del servidor)
         # Esto detendrá la ejecución aquí si hay un error HTTP.
@@ -118,34 +227,35 @@ def hacer_llamada_api(
 
         # Manejar respuesta 204 No Content (común en DELETE o PUT/PATCH sin retorno)
         if response.status_code == 204:
-            logger.info(f"Llamada {metodo} {url} exitosa (204 No Content).")
+            logger.info("Llamada %s %s exitosa (204 No Content).", metodo, url)
             return None # Retornar None explícitamente
 
         # Procesar la respuesta según 'expect_json'
         if expect_json:
             try:
-                # Intentar decodificar JSON. Si response.text está vacío, .json() puede fallar.
-                if not response.text:
-                     logger.warning(f"Respuesta 2xx de {url} recibida sin cuerpo para decodificar JSON.")
+                # Intentar decodificar JSON. Si el cuerpo está vacío, la decodificación falla.
+                # Se mira 'content' (bytes): 'text' decodificaría a str todo el cuerpo solo para comprobarlo.
+                if not response.content:
+                     logger.warning("Respuesta 2xx de %s recibida sin cuerpo para decodificar JSON.", url)
                      return None # O un diccionario vacío {} si es más apropiado
 
-                json_response = response.json()
+                json_response = leer_json(response)
                 # Loguear solo una parte o claves del JSON por si es muy grande o sensible
                 # logger.debug(f"Respuesta JSON decodificada: {str(json_response)[:200]}...")
-                logger.info(f"Llamada {metodo} {url} exitosa (Status: {response.status_code}). Respuesta JSON obtenida.")
+                logger.info("Llamada %s %s exitosa (Status: %s). Respuesta JSON obtenida.", metodo, url, response.status_code)
                 return json_response
             except json.JSONDecodeError as json_err:
-                logger.error(f"Error al decodificar JSON de {url} (Status: {response.status_code}). Respuesta: {response.text[:500]}...")
+                logger.error("Error al decodificar JSON de %s (Status: %s). Respuesta: %s...", url, response.status_code, response.text[:500])
                 # Re-lanzar el error específico para que sea manejado arriba
                 raise json_err
         else:
             # Devolver el objeto Response completo si no se espera JSON
-            logger.info(f"Llamada {metodo} {url} exitosa (Status: {response.status_code}). Devolviendo objeto Response completo.")
+            logger.info("Llamada %s %s exitosa (Status: %s). Devolviendo objeto Response completo.", metodo, url, response.status_code)
             return response
 
     # --- Manejo de Excepciones Específicas ---
     except requests.exceptions.Timeout:
-        logger.error(f"Timeout excedido ({timeout}s) en la llamada API: {metodo} {url}")
+        logger.error("Timeout excedido (%ss) en la llamada API: %s %s", timeout, metodo, url)
         # Re-lanzar Timeout para que la función llamante pueda manejarlo si es necesario
         raise
     except requests.exceptions.RequestException as e:
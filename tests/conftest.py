@@ -0,0 +1,114 @@
+# tests/conftest.py
+"""
+Carga los módulos de acciones con la estructura de paquetes que esperan sus imports relativos
+('..shared.helpers.http_client', '..shared.constants'), usando siempre el código real del repo.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import types
+from typing import Any, Dict, List, Optional
+
+import pytest
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAQUETE = "elitedynamics"
+
+def _paquete(nombre: str) -> None:
+    if nombre not in sys.modules:
+        modulo = types.ModuleType(nombre); modulo.__path__ = [] # type: ignore[attr-defined]
+        sys.modules[nombre] = modulo
+
+def _cargar(nombre: str, ruta: str) -> Any:
+    if nombre in sys.modules: return sys.modules[nombre]
+    spec = importlib.util.spec_from_file_location(nombre, os.path.join(RAIZ, ruta))
+    assert spec is not None and spec.loader is not None
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nombre] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
+
+for _nombre in (PAQUETE, f"{PAQUETE}.shared", f"{PAQUETE}.shared.helpers", f"{PAQUETE}.actions"): _paquete(_nombre)
+_cargar(f"{PAQUETE}.shared.constants", "shared/constants.py")
+_cargar(f"{PAQUETE}.shared.helpers.http_client", "helpers/http_client.py")
+
+class RelojFalso:
+    """Reloj inyectable: time()/monotonic() avanzan solo con avanzar() o sleep(), sin esperas reales."""
+
+    def __init__(self, inicio: float = 1_700_000_000.0) -> None:
+        self.ahora = inicio
+
+    def time(self) -> float: return self.ahora
+    def monotonic(self) -> float: return self.ahora
+    def sleep(self, segundos: float) -> None: self.ahora += max(0.0, segundos)
+    def avanzar(self, segundos: float) -> None: self.ahora += segundos
+
+class TimerFalso:
+    """Sustituto de threading.Timer que registra el intervalo y solo se dispara a mano."""
+    creados: list = []
+
+    def __init__(self, intervalo: float, funcion: Any) -> None:
+        self.intervalo, self.funcion, self.cancelado, self.daemon = intervalo, funcion, False, False
+        TimerFalso.creados.append(self)
+
+    def start(self) -> None: pass
+    def cancel(self) -> None: self.cancelado = True
+    def disparar(self) -> None: self.funcion()
+
+def respuesta(status: int, cuerpo: Any = None, headers: Any = None, url: str = "https://api.test/") -> requests.Response:
+    """requests.Response real con el status, cuerpo JSON y cabeceras indicados."""
+    r = requests.Response()
+    r.status_code, r.url, r.reason = status, url, "Test"
+    r._content = b"" if cuerpo is None else json.dumps(cuerpo).encode("utf-8")
+    r.headers.update(headers or {})
+    return r
+
+class SesionFalsa:
+    """Sesión HTTP falsa: registra cada request() y devuelve las respuestas de 'guion' (callable o lista)."""
+
+    def __init__(self, guion: Any) -> None:
+        self.guion = guion
+        self.llamadas: List[Dict[str, Any]] = []
+
+    def request(self, method: str, url: str, headers: Any = None, **kwargs: Any) -> requests.Response:
+        self.llamadas.append({"method": method, "url": url, "headers": dict(headers or {}), **kwargs})
+        return self.guion(method, url, dict(headers or {})) if callable(self.guion) else self.guion.pop(0)
+
+class CredencialFalsa:
+    """
+    Imita la caché de ClientSecretCredential: cada instancia devuelve el mismo token mientras le queden
+    más de 300 s ('margen'); solo una instancia nueva o la ventana de refresco emite uno distinto.
+    """
+    emitidos = 0
+    vida_s = 3600.0
+    margen = 300.0
+
+    def __init__(self, reloj: Any = None, **kwargs: Any) -> None:
+        self.reloj, self.solicitudes = reloj, 0
+        self.token: Optional[Any] = None
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> Any:
+        ahora = self.reloj.time() if self.reloj else 0.0
+        if self.token is None or self.token.expires_on - ahora <= self.margen:
+            CredencialFalsa.emitidos += 1; self.solicitudes += 1
+            self.token = types.SimpleNamespace(token=f"tok{CredencialFalsa.emitidos}", expires_on=ahora + self.vida_s)
+        return self.token
+
+@pytest.fixture
+def http_client() -> Any:
+    return sys.modules[f"{PAQUETE}.shared.helpers.http_client"]
+
+@pytest.fixture
+def power_bi() -> Any:
+    return _cargar(f"{PAQUETE}.actions.power_bi", "actions/power_bi.py")
+
+@pytest.fixture
+def power_automate() -> Any:
+    return _cargar(f"{PAQUETE}.actions.power_automate", "actions/power_automate.py")
+
+@pytest.fixture
+def reloj() -> RelojFalso:
+    return RelojFalso()
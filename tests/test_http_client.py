@@ -0,0 +1,34 @@
+# tests/test_http_client.py
+
+import json
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from conftest import SesionFalsa, respuesta
+
+def test_payload_que_orjson_rechaza_se_envia_con_json_de_la_stdlib(http_client):
+    sesion = SesionFalsa([respuesta(200, {"ok": True})])
+    payload = {1: "clave entera", "n": 2}
+    assert http_client.hacer_llamada_api("POST", "https://api.test/x", {"Authorization": "Bearer t"}, json_data=payload, session=sesion) == {"ok": True}
+    llamada = sesion.llamadas[0]
+    assert llamada["json"] == payload and llamada["data"] is None
+    assert json.loads(json.dumps(llamada["json"])) == {"1": "clave entera", "n": 2}
+
+def test_payload_serializable_viaja_como_bytes(http_client):
+    sesion = SesionFalsa([respuesta(200, {"ok": True})])
+    http_client.hacer_llamada_api("POST", "https://api.test/x", {"Authorization": "Bearer t"}, json_data={"a": 1}, session=sesion)
+    llamada = sesion.llamadas[0]
+    if http_client.orjson is not None: assert json.loads(llamada["data"]) == {"a": 1} and llamada["json"] is None
+    else: assert llamada["json"] == {"a": 1}
+
+def test_retry_after_en_segundos_fecha_o_invalido(http_client):
+    segundos = http_client.segundos_retry_after
+    assert segundos(respuesta(429, headers={"Retry-After": "7"}), 30.0) == 7.0
+    assert segundos(respuesta(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}), 30.0) == 0.0 # Fecha pasada: no esperar
+    assert 3500 < segundos(respuesta(429, headers={"Retry-After": format_datetime(datetime.now(timezone.utc) + timedelta(hours=1), usegmt=True)}), 30.0) <= 3600
+    assert segundos(respuesta(429, headers={"Retry-After": "pronto"}), 30.0) == 30.0
+    assert segundos(respuesta(429), 1.0) == 1.0
+
+def test_escribir_json_cae_a_la_stdlib_si_orjson_lo_rechaza(http_client):
+    assert json.loads(http_client.escribir_json({1: "a", "grande": 2 ** 70})) == {"1": "a", "grande": 2 ** 70}
+    assert json.loads(http_client.escribir_json({"a": [1, 2]})) == {"a": [1, 2]}
@@ -0,0 +1,174 @@
+# tests/test_power_automate.py
+
+import json
+import sys
+import threading
+import types
+
+import azure.identity
+import pytest
+import requests
+
+from conftest import PAQUETE, CredencialFalsa, SesionFalsa, _cargar, respuesta
+
+CONFIG_ARM = {"suscripcion_id": "sub", "grupo_recurso": "rg", "client_id": "c", "tenant_id": "t", "client_secret": "s", "ubicacion": ""}
+
+def _preparar(power_automate, monkeypatch, reloj, sesion):
+    monkeypatch.setattr(power_automate, "time", reloj)
+    monkeypatch.setattr(power_automate, "_config_arm_pa", CONFIG_ARM)
+    monkeypatch.setattr(power_automate, "_ARM_SESSION", sesion)
+    monkeypatch.setattr(azure.identity, "ClientSecretCredential", lambda **kw: CredencialFalsa(reloj))
+    for nombre, valor in (("_credential_pa", None), ("_cached_mgmt_token_pa", None), ("_expira_mgmt_token_pa", 0.0), ("_cached_mgmt_headers_pa", None)):
+        monkeypatch.setattr(power_automate, nombre, valor)
+
+def test_401_reintenta_con_un_token_distinto(power_automate, monkeypatch, reloj):
+    sesion = SesionFalsa([respuesta(401), respuesta(200, {"value": []})])
+    _preparar(power_automate, monkeypatch, reloj, sesion)
+    assert power_automate.listar_flows({}, {}) == {"value": []}
+    primera, reintento = (llamada["headers"]["Authorization"] for llamada in sesion.llamadas)
+    assert primera != reintento
+
+def test_lote_arm_acepta_retry_after_como_fecha_http(power_automate, monkeypatch, reloj):
+    sondeo = {"Location": "https://management.azure.com/batch/op", "Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    sesion = SesionFalsa([respuesta(202, headers=sondeo), respuesta(200, {"responses": [{"name": "a", "httpStatusCode": 200}]})])
+    _preparar(power_automate, monkeypatch, reloj, sesion)
+    respuestas = power_automate._ejecutar_lote_arm([{"name": "a", "httpMethod": "GET", "url": "/x"}], {"Authorization": "Bearer t"})
+    assert respuestas == [{"name": "a", "httpStatusCode": 200}] and len(sesion.llamadas) == 2
+
+def test_nombres_de_flow_validos_e_invalidos(power_automate):
+    for nombre in ("flujo-1", "_interno", "(copia)flujo", ".v2", "a" * 80):
+        power_automate._validar_flow(nombre)
+    for nombre in ("", "a/b", "a?b", "a#b", "a%2Fb", "a b", "a\n", "a" * 81):
+        with pytest.raises(ValueError): power_automate._validar_flow(nombre)
+
+def test_circuito_se_abre_tras_los_fallos_y_deja_una_prueba(power_automate, monkeypatch, reloj):
+    monkeypatch.setattr(power_automate, "time", reloj)
+    circuito = power_automate._CircuitoARM(fallos_max=2, reinicio_s=30.0)
+    circuito.antes(); circuito.fallo(); circuito.antes(); circuito.fallo()
+    with pytest.raises(Exception, match="Circuito ARM abierto"): circuito.antes()
+    reloj.avanzar(30)
+    circuito.antes() # Semiabierto: pasa una llamada de prueba...
+    with pytest.raises(Exception, match="Circuito ARM abierto"): circuito.antes() # ...y solo una
+    circuito.exito()
+    circuito.antes(); circuito.antes() # La prueba salió bien: circuito cerrado
+
+def test_llamada_arm_no_abre_el_circuito_con_4xx(power_automate, monkeypatch, reloj):
+    sesion = SesionFalsa(lambda metodo, url, cabeceras: respuesta(404, {"error": {"code": "NotFound"}}))
+    _preparar(power_automate, monkeypatch, reloj, sesion)
+    monkeypatch.setattr(power_automate, "_circuito_arm", power_automate._CircuitoARM(fallos_max=2))
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.HTTPError): power_automate._llamada_arm("GET", "https://management.azure.com/x", {"Authorization": "Bearer t"})
+    assert len(sesion.llamadas) == 3 # Un 404 es una respuesta válida: el circuito sigue cerrado
+
+def test_lote_arm_fallido_solo_marca_sus_subsolicitudes(power_automate, monkeypatch):
+    def lote_falso(solicitudes, auth_headers):
+        if any(sol["name"] == "c" for sol in solicitudes): raise Exception("HTTP 503")
+        return [{"name": sol["name"], "httpStatusCode": 200, "content": sol["name"]} for sol in solicitudes]
+    monkeypatch.setattr(power_automate, "ARM_BATCH_MAX_SOLICITUDES", 2)
+    monkeypatch.setattr(power_automate, "_ejecutar_lote_arm", lote_falso)
+    resultados = power_automate._resolver_lotes_arm([{"name": n} for n in "abc"], {})
+    assert resultados == {"a": ("a", None), "b": ("b", None), "c": (None, "HTTP 503")}
+
+def test_agrupador_junta_consultas_de_varios_hilos_en_un_lote(power_automate, monkeypatch, reloj):
+    lotes: list = []
+    def estados_falsos(parametros, headers):
+        lotes.append(sorted(e["run_id"] for e in parametros["ejecuciones"]))
+        return {"value": [{"run_id": e["run_id"], "error": "HTTP 404"} if e["run_id"] == "mal" else {"run_id": e["run_id"], "estado": {"id": e["run_id"]}} for e in parametros["ejecuciones"]]}
+    monkeypatch.setattr(power_automate, "time", reloj)
+    monkeypatch.setattr(power_automate, "BATCH_MAX_WAIT_MS", 60_000) # La ventana no vence: el lote se cierra por tamaño
+    monkeypatch.setattr(power_automate, "BATCH_MAX_SIZE", 3)
+    monkeypatch.setattr(power_automate, "obtener_estados_batch", estados_falsos)
+    agrupador = power_automate._AgrupadorEstados()
+    resultados: dict = {}
+    def consultar(run_id):
+        try: resultados[run_id] = agrupador.consultar({"nombre_flow": "f", "run_id": run_id, "agrupar": True})
+        except Exception as e: resultados[run_id] = str(e)
+    hilos = [threading.Thread(target=consultar, args=(run_id,)) for run_id in ("r1", "r2", "mal")]
+    for hilo in hilos: hilo.start()
+    for hilo in hilos: hilo.join(10)
+    assert lotes == [["mal", "r1", "r2"]]
+    assert resultados["r1"] == {"id": "r1"} and resultados["r2"] == {"id": "r2"} and "HTTP 404" in resultados["mal"]
+
+def _cuerpo(llamada):
+    """Cuerpo JSON enviado, tanto si salió serializado con orjson ('data') como con 'json'."""
+    return json.loads(llamada["data"]) if llamada.get("data") is not None else llamada.get("json")
+
+def test_actualizar_flow_hace_put_con_la_ubicacion_cacheada(power_automate, monkeypatch, reloj):
+    definicion = {"triggers": {}, "actions": {}}
+    sesion = SesionFalsa([respuesta(200, {"location": "westeurope"}), respuesta(200, {"name": "f1", "location": "westeurope"}), respuesta(200, {"name": "f1", "location": "westeurope"})])
+    _preparar(power_automate, monkeypatch, reloj, sesion)
+    monkeypatch.setattr(power_automate, "_LOCATION_CACHE", {})
+    power_automate.actualizar_flow({"nombre_flow": "f1", "definicion_flow": definicion}, {})
+    power_automate.actualizar_flow({"nombre_flow": "f1", "definicion_flow": definicion}, {})
+    assert [llamada["method"] for llamada in sesion.llamadas] == ["GET", "PUT", "PUT"] # Un solo GET, solo con la caché vacía
+    for llamada in sesion.llamadas[1:]: assert _cuerpo(llamada) == {"location": "westeurope", "properties": {"definition": definicion}}
+
+def test_ejecutar_flow_envia_payloads_que_orjson_rechaza(power_automate, monkeypatch):
+    sesion = SesionFalsa([respuesta(200, {"ok": True})])
+    monkeypatch.setattr(power_automate, "_TRIGGER_SESSION", sesion)
+    sesion.post = lambda url, **kwargs: sesion.request("POST", url, **kwargs)
+    resultado = power_automate.ejecutar_flow({"flow_url": "https://prod.logic.azure.com/trigger", "payload": {1: "a"}}, {})
+    assert resultado["status_code"] == 200 and json.loads(sesion.llamadas[0]["data"]) == {"1": "a"}
+
+@pytest.mark.parametrize("modulo, ruta, global_, accesor", [("power_automate", "actions/power_automate.py", "_ARM_EXECUTOR", "_executor_arm"), ("power_bi", "actions/power_bi.py", "_PBI_EXECUTOR", "_executor_pbi")])
+def test_el_pool_de_hilos_se_crea_en_el_primer_uso(monkeypatch, modulo, ruta, global_, accesor):
+    nombre = f"{PAQUETE}.actions.{modulo}_fresco"
+    monkeypatch.delitem(sys.modules, nombre, raising=False)
+    fresco = _cargar(nombre, ruta)
+    assert getattr(fresco, global_) is None # Importar no crea el executor
+    executor = getattr(fresco, accesor)()
+    try: assert executor is getattr(fresco, accesor)() is getattr(fresco, global_)
+    finally: executor.shutdown(wait=False)
+
+def test_dos_401_con_el_mismo_token_piden_un_solo_token_nuevo(power_automate, monkeypatch, reloj):
+    _preparar(power_automate, monkeypatch, reloj, SesionFalsa([]))
+    rechazadas = dict(power_automate._get_auth_headers_for_mgmt())
+    emitidos = CredencialFalsa.emitidos
+    primera = power_automate._renovar_auth_mgmt(rechazadas)
+    segunda = power_automate._renovar_auth_mgmt(rechazadas) # Otro hilo con el mismo 401: el token ya se renovó
+    assert primera["Authorization"] == segunda["Authorization"] != rechazadas["Authorization"]
+    assert CredencialFalsa.emitidos == emitidos + 1
+
+def test_eliminar_flows_reporta_cada_flow_por_separado(power_automate, monkeypatch, reloj):
+    estados = {"f-ok": 200, "f-no-existe": 404, "f-roto": 400}
+    sesion = SesionFalsa(lambda metodo, url, cabeceras: respuesta(next(e for n, e in estados.items() if f"/workflows/{n}?" in url)))
+    _preparar(power_automate, monkeypatch, reloj, sesion)
+    monkeypatch.setattr(power_automate, "_circuito_arm", power_automate._CircuitoARM())
+    resultado = power_automate.eliminar_flows({"nombres_flow": list(estados)}, {})["value"]
+    assert [r["flow"] for r in resultado] == list(estados) # Mismo orden que la entrada
+    assert resultado[0] == {"status": "Eliminado", "flow": "f-ok"}
+    assert resultado[1] == {"status": "Eliminado", "flow": "f-no-existe", "code": 404, "noop": True}
+    assert resultado[2]["status"] == "Fallido" and "400" in resultado[2]["error"]
+
+def _sesion_trigger(monkeypatch, power_automate, resultado):
+    """Sesión de triggers falsa: 'resultado' es la respuesta o la excepción del POST."""
+    llamadas: list = []
+    def post(url, **kwargs):
+        llamadas.append({"url": url, **kwargs})
+        if isinstance(resultado, Exception): raise resultado
+        return resultado
+    monkeypatch.setattr(power_automate, "_TRIGGER_SESSION", types.SimpleNamespace(post=post))
+    return llamadas
+
+def test_ejecutar_flow_sin_esperar_devuelve_la_url_de_sondeo(power_automate, monkeypatch):
+    llamadas = _sesion_trigger(monkeypatch, power_automate, respuesta(202, headers={"Location": "https://prod.logic.azure.com/runs/1"}))
+    resultado = power_automate.ejecutar_flow({"flow_url": "https://prod.logic.azure.com/trigger", "esperar_respuesta": False}, {})
+    assert resultado == {"status": "En ejecución", "status_code": 202, "poll_url": "https://prod.logic.azure.com/runs/1"}
+    assert llamadas[0]["timeout"] == power_automate._TIMEOUT_DISPARO_S
+
+def test_ejecutar_flow_sin_esperar_tolera_el_timeout_de_lectura(power_automate, monkeypatch):
+    _sesion_trigger(monkeypatch, power_automate, requests.exceptions.ReadTimeout("lento"))
+    assert power_automate.ejecutar_flow({"flow_url": "https://prod.logic.azure.com/trigger", "esperar_respuesta": False}, {}) == {"status": "Enviado", "status_code": None, "poll_url": None}
+    with pytest.raises(Exception, match="Error API ejecutando trigger flow"): power_automate.ejecutar_flow({"flow_url": "https://prod.logic.azure.com/trigger"}, {})
+
+def test_listar_flows_con_detalles_enriquece_via_batch(power_automate, monkeypatch, reloj):
+    def guion(metodo, url, cabeceras):
+        if metodo == "GET": return respuesta(200, {"value": [{"name": "f1"}, {"name": "f2"}]})
+        nombres = [sol["name"] for sol in _cuerpo(sesion.llamadas[-1])["requests"]] # POST /batch: una sub-respuesta por sub-solicitud
+        return respuesta(200, {"responses": [{"name": nombres[0], "httpStatusCode": 200, "content": {"value": [{"name": "run1"}]}}, {"name": nombres[1], "httpStatusCode": 404, "content": {"error": "NotFound"}}]})
+    sesion = SesionFalsa(guion)
+    _preparar(power_automate, monkeypatch, reloj, sesion)
+    flows = power_automate.listar_flows_con_detalles({}, {})["value"]
+    assert [llamada["method"] for llamada in sesion.llamadas] == ["GET", "POST"] # Listado + un solo lote para todas las últimas ejecuciones
+    assert flows[0]["ultima_ejecucion"] == {"name": "run1"}
+    assert "ultima_ejecucion" not in flows[1] and "HTTP 404" in flows[1]["error_ultima_ejecucion"]
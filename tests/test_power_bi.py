@@ -0,0 +1,210 @@
+# tests/test_power_bi.py
+
+import json
+import threading
+from concurrent.futures import Future
+from types import MappingProxyType
+
+import pytest
+
+from conftest import CredencialFalsa, SesionFalsa, TimerFalso, respuesta
+
+WS = "11111111-1111-1111-1111-111111111111"
+DS = "22222222-2222-2222-2222-222222222222"
+CABECERAS = MappingProxyType({"Authorization": "Bearer t1", "Content-Type": "application/json"})
+
+def _preparar(power_bi, monkeypatch, reloj, sesion):
+    monkeypatch.setattr(power_bi, "time", reloj)
+    monkeypatch.setattr(power_bi, "_PBI_SESSION", sesion)
+    monkeypatch.setattr(power_bi, "_get_auth_headers_for_pbi", lambda: CABECERAS)
+    monkeypatch.setattr(power_bi, "_get_pbi_token", lambda: "t1")
+    monkeypatch.setattr(power_bi, "_cubo_pbi", power_bi._CuboTokensPBI(power_bi._PBI_TASA_POR_S, power_bi._PBI_RAFAGA_MAX))
+    power_bi._cache_pbi.clear()
+
+def test_429_de_refresco_no_pausa_el_cubo_compartido(power_bi, monkeypatch, reloj):
+    sesion = SesionFalsa([respuesta(429, headers={"Retry-After": "5"}), respuesta(200, {"value": []})])
+    _preparar(power_bi, monkeypatch, reloj, sesion)
+    resultado = power_bi.refrescar_dataset({"workspace_id": WS, "dataset_id": DS}, {})
+    assert resultado["status_code"] == 429 and resultado["retry_after_s"] == 5.0
+    inicio = reloj.ahora
+    power_bi.listar_workspaces({}, {}) # Una llamada ajena al dataset no espera el Retry-After
+    assert reloj.ahora == inicio
+
+def test_429_de_la_api_pausa_el_cubo_compartido(power_bi, monkeypatch, reloj):
+    sesion = SesionFalsa([respuesta(429, headers={"Retry-After": "5"}), respuesta(200, {"value": []})])
+    _preparar(power_bi, monkeypatch, reloj, sesion)
+    try: power_bi.listar_workspaces({}, {})
+    except Exception: pass
+    inicio = reloj.ahora
+    power_bi.listar_workspaces({"sin_cache": True}, {})
+    assert reloj.ahora - inicio >= 5.0
+
+def _preparar_credencial(power_bi, monkeypatch, reloj):
+    """Token real del módulo con una credencial falsa (caché como azure-identity) y Timer que no se dispara solo."""
+    monkeypatch.setattr(power_bi, "time", reloj)
+    monkeypatch.setattr(power_bi, "_config_pbi", {"client_id": "c", "tenant_id": "t", "client_secret": "s"})
+    monkeypatch.setattr(power_bi, "ClientSecretCredential", lambda **kw: CredencialFalsa(reloj))
+    monkeypatch.setattr(power_bi.threading, "Timer", TimerFalso)
+    for nombre, valor in (("_credential_pbi", None), ("_cached_pbi_token", None), ("_expira_pbi_token", 0.0), ("_cached_pbi_headers", None), ("_timer_renovacion_pbi", None)):
+        monkeypatch.setattr(power_bi, nombre, valor)
+
+def test_401_reintenta_con_un_token_distinto(power_bi, monkeypatch, reloj):
+    _preparar_credencial(power_bi, monkeypatch, reloj)
+    sesion = SesionFalsa([respuesta(401), respuesta(200, {"value": []})])
+    monkeypatch.setattr(power_bi, "_PBI_SESSION", sesion)
+    power_bi._cache_pbi.clear()
+    assert power_bi.listar_workspaces({"sin_cache": True}, {}) == {"value": []}
+    primera, reintento = (llamada["headers"]["Authorization"] for llamada in sesion.llamadas)
+    assert primera != reintento
+
+def test_timer_renueva_antes_del_margen_del_camino_rapido(power_bi, monkeypatch, reloj):
+    _preparar_credencial(power_bi, monkeypatch, reloj)
+    TimerFalso.creados.clear()
+    primero = power_bi._get_pbi_token()
+    timer = TimerFalso.creados[-1]
+    assert timer.intervalo == CredencialFalsa.vida_s - power_bi._ANTELACION_RENOVACION_S
+    reloj.avanzar(timer.intervalo); timer.disparar()
+    renovado = power_bi._cached_pbi_token
+    assert renovado != primero and power_bi._expira_pbi_token - reloj.time() > power_bi._MARGEN_RENOVACION_TOKEN_S
+    # El camino rápido acepta el token renovado sin ir a AAD, también ya dentro del margen del token anterior
+    emitidos = CredencialFalsa.emitidos
+    reloj.avanzar(power_bi._ANTELACION_RENOVACION_S - power_bi._MARGEN_RENOVACION_TOKEN_S + 1)
+    assert power_bi._get_pbi_token() == renovado and CredencialFalsa.emitidos == emitidos
+    assert TimerFalso.creados[-1] is not timer and TimerFalso.creados[-1].intervalo == timer.intervalo # Reprogramado para el token nuevo
+
+def test_lote_solo_admite_post_a_rutas_permitidas(power_bi, monkeypatch, reloj):
+    sesion = SesionFalsa(lambda metodo, url, cabeceras: respuesta(200, {"results": []}))
+    _preparar(power_bi, monkeypatch, reloj, sesion)
+    permitida = f"/groups/{WS}/datasets/{DS}/executeQueries"
+    assert "resultado" in power_bi.ejecutar_lote_pbi({"solicitudes": [{"method": "POST", "ruta": permitida, "body": {}}]}, {})["value"][0]
+    for ruta in ("/groups", f"/groups/{WS}/users", f"/groups/{WS}/reports/{DS}/Clone", f"/groups/{WS}/datasets/{DS}/Default.TakeOver", "/admin/workspaces/getInfo", permitida + "?x=1"):
+        with pytest.raises(ValueError): power_bi.ejecutar_lote_pbi({"solicitudes": [{"method": "POST", "ruta": ruta}]}, {})
+    with pytest.raises(ValueError): power_bi.ejecutar_lote_pbi({"solicitudes": [{"method": "GET", "ruta": "/groups", "params": {"$top": 1}}]}, {})
+    assert len(sesion.llamadas) == 1
+
+def test_contenido_sin_admin_reparte_por_workspace_sin_expand(power_bi, monkeypatch, reloj):
+    def guion(metodo, url, cabeceras):
+        if url.endswith("/groups"): return respuesta(200, {"value": [{"id": WS, "name": "ws"}]})
+        return respuesta(200, {"value": [{"id": DS, "coleccion": url.rsplit("/", 1)[1]}]})
+    sesion = SesionFalsa(guion)
+    _preparar(power_bi, monkeypatch, reloj, sesion)
+    (workspace,) = power_bi.listar_workspaces_con_contenido({}, {})["value"]
+    assert workspace["name"] == "ws" and workspace["reports"] == [{"id": DS, "coleccion": "reports"}]
+    assert workspace["dashboards"] and workspace["datasets"] and all("$expand" not in llamada["url"] for llamada in sesion.llamadas)
+
+def test_top_no_numerico_da_error_claro(power_bi):
+    with pytest.raises(ValueError, match="'top' debe ser un entero"): power_bi.listar_workspaces_con_contenido({"como_admin": True, "top": "x"}, {})
+
+def test_cache_llena_descarta_la_menos_usada(power_bi, monkeypatch, reloj):
+    sesion = SesionFalsa(lambda metodo, url, cabeceras: respuesta(200, {"url": url}))
+    _preparar(power_bi, monkeypatch, reloj, sesion)
+    monkeypatch.setattr(power_bi, "_PBI_CACHE_MAX", 2)
+    a, b, c = (f"{power_bi._GROUPS_URL}?n={n}" for n in "abc")
+    power_bi._leer_cacheado(a, CABECERAS); power_bi._leer_cacheado(b, CABECERAS)
+    power_bi._leer_cacheado(a, CABECERAS) # Acierto: 'a' pasa a ser la más reciente
+    power_bi._leer_cacheado(c, CABECERAS)
+    assert list(power_bi._cache_pbi) == [a, c] and len(sesion.llamadas) == 3
+
+@pytest.mark.parametrize("valor, esperado", [(None, False), (False, False), ("false", False), ("0", False), ("no", False), (True, True), ("true", True), ("1", True), ("Sí", True)])
+def test_booleanos_de_query_string(power_bi, valor, esperado):
+    assert power_bi._booleano({"sin_cache": valor}, "sin_cache") is esperado
+
+def test_booleano_invalido_da_error_claro(power_bi):
+    with pytest.raises(ValueError, match="'todas_las_paginas' debe ser un booleano"):
+        power_bi.listar_dashboards({"workspace_id": WS, "todas_las_paginas": "quizas"}, {})
+
+def test_sin_cache_false_usa_la_cache(power_bi, monkeypatch, reloj):
+    sesion = SesionFalsa(lambda metodo, url, cabeceras: respuesta(200, {"value": []}))
+    _preparar(power_bi, monkeypatch, reloj, sesion)
+    power_bi.listar_workspaces({}, {}); power_bi.listar_workspaces({"sin_cache": "false"}, {})
+    assert len(sesion.llamadas) == 1
+
+def test_cubo_admite_rafaga_y_luego_la_tasa(power_bi, monkeypatch, reloj):
+    monkeypatch.setattr(power_bi, "time", reloj)
+    cubo = power_bi._CuboTokensPBI(2.0, 3)
+    for _ in range(3): cubo.adquirir()
+    assert reloj.ahora == 1_700_000_000.0 # La ráfaga no espera
+    cubo.adquirir()
+    assert reloj.ahora - 1_700_000_000.0 == pytest.approx(0.5) # Después, una llamada cada 1/tasa segundos
+
+def test_cubo_pausado_bloquea_hasta_el_retry_after(power_bi, monkeypatch, reloj):
+    monkeypatch.setattr(power_bi, "time", reloj)
+    cubo = power_bi._CuboTokensPBI(2.0, 3)
+    inicio = reloj.ahora
+    cubo.pausar(5.0); cubo.adquirir()
+    assert reloj.ahora - inicio >= 5.0
+
+def test_etag_revalida_con_304_y_renueva_el_ttl(power_bi, monkeypatch, reloj):
+    sesion = SesionFalsa([respuesta(200, {"value": ["ws"]}, headers={"ETag": '"v1"'}), respuesta(304)])
+    _preparar(power_bi, monkeypatch, reloj, sesion)
+    monkeypatch.setattr(power_bi, "PBI_CACHE_TTL_S", 60.0)
+    assert power_bi._leer_cacheado(power_bi._GROUPS_URL, CABECERAS) == {"value": ["ws"]}
+    reloj.avanzar(61)
+    assert power_bi._leer_cacheado(power_bi._GROUPS_URL, CABECERAS) == {"value": ["ws"]} # 304: se reutiliza el cuerpo cacheado
+    assert sesion.llamadas[1]["headers"]["If-None-Match"] == '"v1"'
+    reloj.avanzar(30)
+    power_bi._leer_cacheado(power_bi._GROUPS_URL, CABECERAS)
+    assert len(sesion.llamadas) == 2 # El 304 renovó el TTL
+
+def test_get_identicos_simultaneos_comparten_una_peticion(power_bi, monkeypatch, reloj):
+    entrado, liberar = threading.Event(), threading.Event()
+    def guion(metodo, url, cabeceras):
+        entrado.set(); liberar.wait(5)
+        return respuesta(200, {"value": ["ws"]})
+    sesion = SesionFalsa(guion)
+    _preparar(power_bi, monkeypatch, reloj, sesion)
+    esperando = threading.Event()
+    class FuturoEspiado(Future):
+        def result(self, timeout=None):
+            esperando.set(); return super().result(timeout)
+    monkeypatch.setattr(power_bi, "Future", FuturoEspiado)
+    resultados: list = []
+    hilos = [threading.Thread(target=lambda: resultados.append(power_bi._get_fusionado(power_bi._GROUPS_URL, CABECERAS))) for _ in range(2)]
+    hilos[0].start(); assert entrado.wait(5) # El primero ya tiene la petición en curso...
+    hilos[1].start(); assert esperando.wait(5) # ...y el segundo espera su Future en lugar de pedir otra vez
+    liberar.set()
+    for hilo in hilos: hilo.join(5)
+    assert len(sesion.llamadas) == 1 and resultados == [({"value": ["ws"]}, None)] * 2
+
+def test_esperar_refresco_sondea_hasta_el_estado_final(power_bi, monkeypatch, reloj):
+    estados = iter(["Unknown", "Unknown", "Completed"])
+    sesion = SesionFalsa(lambda metodo, url, cabeceras: respuesta(200, {"value": [{"requestId": "r1", "status": next(estados)}]}))
+    _preparar(power_bi, monkeypatch, reloj, sesion)
+    resultado = power_bi.esperar_refresco_dataset({"workspace_id": WS, "dataset_id": DS}, {})
+    assert resultado == {"finalizado": True, "refresco": {"requestId": "r1", "status": "Completed"}} and len(sesion.llamadas) == 3
+
+def test_esperar_refresco_se_corta_antes_del_limite_http(power_bi, monkeypatch, reloj):
+    sesion = SesionFalsa(lambda metodo, url, cabeceras: respuesta(200, {"value": [{"status": "Unknown"}]}))
+    _preparar(power_bi, monkeypatch, reloj, sesion)
+    inicio = reloj.ahora
+    resultado = power_bi.esperar_refresco_dataset({"workspace_id": WS, "dataset_id": DS, "timeout_s": 3600}, {})
+    assert resultado["finalizado"] is False and reloj.ahora - inicio <= power_bi._TIMEOUT_ESPERA_MAX_S < 230
+
+@pytest.mark.parametrize("timeout_s", ["x", None, 0, -5])
+def test_timeout_s_invalido_da_error_claro_sin_lanzar_el_refresco(power_bi, monkeypatch, reloj, timeout_s):
+    sesion = SesionFalsa([])
+    _preparar(power_bi, monkeypatch, reloj, sesion)
+    with pytest.raises(ValueError, match="'timeout_s' debe ser"): power_bi.refrescar_dataset_y_esperar({"workspace_id": WS, "dataset_id": DS, "timeout_s": timeout_s}, {})
+    assert sesion.llamadas == []
+
+def test_dos_401_con_el_mismo_token_piden_un_solo_token_nuevo(power_bi, monkeypatch, reloj):
+    _preparar_credencial(power_bi, monkeypatch, reloj)
+    rechazadas = dict(power_bi._get_auth_headers_for_pbi())
+    emitidos = CredencialFalsa.emitidos
+    primera = power_bi._renovar_auth_pbi(rechazadas)
+    segunda = power_bi._renovar_auth_pbi(rechazadas) # Otro hilo con el mismo 401: el token ya se renovó
+    assert primera["Authorization"] == segunda["Authorization"] != rechazadas["Authorization"]
+    assert CredencialFalsa.emitidos == emitidos + 1
+
+def test_embed_info_junta_url_y_token(power_bi, monkeypatch, reloj):
+    rep = "33333333-3333-3333-3333-333333333333"
+    reporte = {"id": rep, "name": "Ventas", "embedUrl": f"https://app.powerbi.com/reportEmbed?reportId={rep}", "datasetId": DS}
+    token = {"token": "emb", "tokenId": "tid", "expiration": "2026-10-18T10:00:00Z"}
+    sesion = SesionFalsa(lambda metodo, url, cabeceras: respuesta(200, token if metodo == "POST" else reporte))
+    _preparar(power_bi, monkeypatch, reloj, sesion)
+    resultado = power_bi.obtener_embed_info({"workspace_id": WS, "report_id": rep}, {})
+    assert resultado == {**reporte, "embedToken": "emb", "tokenId": "tid", "expiration": "2026-10-18T10:00:00Z"}
+    post = next(llamada for llamada in sesion.llamadas if llamada["method"] == "POST")
+    cuerpo = json.loads(post["data"]) if post.get("data") is not None else post.get("json")
+    assert post["url"].endswith(f"/reports/{rep}/GenerateToken") and cuerpo == {"accessLevel": "View"}
+    with pytest.raises(ValueError, match="'access_level'"): power_bi.obtener_embed_info({"workspace_id": WS, "report_id": rep, "access_level": "Admin"}, {})